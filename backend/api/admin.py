@@ -1,21 +1,53 @@
 from django.contrib import admin
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
 
-from .models import (CustomUser, Favorite, Ingredient, IngredientRecipe,
-                     Recipe, RecipeTag, Tag)
+from .carts import track_recipe
+from .models import (CustomUser, Ingredient, IngredientRecipe, Recipe,
+                     RecipeTag, Tag)
 
 admin.site.empty_value_display = 'Не задано'
 
 
-class CustomUserAdmin(admin.ModelAdmin):
+class EstimatedCountPaginator(Paginator):
+    """Пагинатор, который для больших таблиц без фильтров берет оценку
+    числа строк из статистики PostgreSQL вместо COUNT(*)."""
+    estimate_threshold = 100000
+
+    @cached_property
+    def count(self):
+        query = self.object_list.query
+        connection = connections[self.object_list.db]
+        if connection.vendor == 'postgresql' and not query.where:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SELECT reltuples FROM pg_class WHERE relname = %s',
+                    [query.model._meta.db_table]
+                )
+                row = cursor.fetchone()
+            if row and row[0] > self.estimate_threshold:
+                return int(row[0])
+        return super().count
+
+
+class BaseAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+class CustomUserAdmin(BaseAdmin):
     list_display = (
         'email',
         'username',
         'first_name',
         'last_name',
+        'recipes_count',
+        'followers_count',
     )
-    list_filter = (
-        'email',
-        'username'
+    search_fields = (
+        '^email',
+        '^username'
     )
 
 
@@ -27,19 +59,20 @@ class TagAdmin(admin.ModelAdmin):
     )
 
 
-class IngredientsAdmin(admin.ModelAdmin):
+class IngredientsAdmin(BaseAdmin):
     list_display = (
         'name',
         'measurement_unit'
     )
-    list_filter = (
-        'name',
+    search_fields = (
+        '^name',
     )
 
 
 class IngredientRecipeInline(admin.TabularInline):
     model = IngredientRecipe
     extra = 1
+    autocomplete_fields = ('ingredient',)
 
 
 class RecipeTagsInline(admin.TabularInline):
@@ -47,7 +80,7 @@ class RecipeTagsInline(admin.TabularInline):
     extra = 1
 
 
-class RecipeAdmin(admin.ModelAdmin):
+class RecipeAdmin(BaseAdmin):
     list_display = (
         'name',
         'author',
@@ -56,27 +89,41 @@ class RecipeAdmin(admin.ModelAdmin):
         'display_favorites'
     )
     list_filter = (
-        'author',
+        'tags',
+    )
+    list_select_related = ('author',)
+    search_fields = (
         'name',
-        'tags'
+        '^author__username',
     )
-    filter_horizontal = ('tags', 'ingredients')
+    autocomplete_fields = ('author',)
     inlines = (IngredientRecipeInline, RecipeTagsInline)
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).prefetch_related(
+            'tags', 'ingredients')
+
+    def save_related(self, request, form, formsets, change):
+        if not change:
+            return super().save_related(request, form, formsets, change)
+        with track_recipe(form.instance.pk):
+            super().save_related(request, form, formsets, change)
+
     def display_ingredients(self, obj):
-        ingredients = obj.ingredients.all().values_list(
-            'name', 'measurement_unit')
-        return ", ".join([f'{name} ({unit})' for name, unit in ingredients])
+        return ", ".join([
+            f'{ingredient.name} ({ingredient.measurement_unit})'
+            for ingredient in obj.ingredients.all()
+        ])
     display_ingredients.short_description = 'Ингредиенты'
 
     def display_tags(self, obj):
-        tags = obj.tags.all().values_list('name', flat=True)
-        return ", ".join([f'{name}' for name in tags])
+        return ", ".join([f'{tag.name}' for tag in obj.tags.all()])
     display_tags.short_description = 'Теги'
 
     def display_favorites(self, obj):
-        return Favorite.objects.filter(recipe=obj).count()
+        return obj.favorites_count
     display_favorites.short_description = 'Добавлено в избранное'
+    display_favorites.admin_order_field = 'favorites_count'
 
 
 admin.site.register(CustomUser, CustomUserAdmin)
@@ -0,0 +1,275 @@
+"""Асинхронные представления частых запросов на чтение.
+
+Подключаются в urls.py при ASYNC_API=true и рассчитаны на ASGI-сервер
+(uvicorn). GET и HEAD обрабатываются асинхронным ORM и теми же
+сериализаторами, что и в views.py, остальные методы передаются
+синхронным представлениям DRF.
+"""
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.urls import path
+from django.utils.cache import get_conditional_response, quote_etag
+from django_filters import ModelChoiceFilter, ModelMultipleChoiceFilter
+from django_filters.utils import translate_validation
+from rest_framework import exceptions
+from rest_framework.negotiation import DefaultContentNegotiation
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from rest_framework.views import exception_handler
+
+from .authentication import aget_token, check_token
+from .caching import (RECIPES_CACHE_TIMEOUT, aget_recipes_generation,
+                      catalogue_etag, patch_catalogue_cache_control,
+                      recipes_cache_key)
+from .filters import RecipesFilter
+from .indexes import ingredient_index, tag_cache
+from .models import CustomUser, Recipe
+from .paginators import CustomNumberPaginator
+from .renderers import (ORJSONRenderer, ShoppingListCSVRenderer,
+                        ShoppingListJSONRenderer, ShoppingListTextRenderer)
+from .serializers import RecipeReadSerializer, SubscriptionSerializer
+from .units import format_amount
+from .views import CustomUserViewSet, RecipesViewSet
+
+SHOPPING_LIST_RENDERERS = (
+    ShoppingListTextRenderer,
+    ShoppingListCSVRenderer,
+    ShoppingListJSONRenderer,
+)
+# Фильтры, проверка значений которых обращается к БД.
+MODEL_FILTERS = frozenset(
+    name for name, field in RecipesFilter.base_filters.items()
+    if isinstance(field, (ModelChoiceFilter, ModelMultipleChoiceFilter))
+)
+
+json_renderer = ORJSONRenderer()
+negotiator = DefaultContentNegotiation()
+
+
+def get_authenticators():
+    return [auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES]
+
+
+async def authenticate(request):
+    """Определяет пользователя запроса.
+
+    Токен проверяется по кешу или асинхронным запросом к БД. Базовая и
+    сессионная аутентификация DRF синхронные, для них делается один
+    переход в поток.
+    """
+    header = request.headers.get('Authorization', '')
+    credentials = header.split()
+    if len(credentials) == 2 and credentials[0].lower() == 'token':
+        request.user, request.auth = check_token(
+            await aget_token(credentials[1]))
+    elif header or settings.SESSION_COOKIE_NAME in request.COOKIES:
+        await sync_to_async(getattr)(request, 'user')
+    else:
+        request.user, request.auth = AnonymousUser(), None
+
+
+def require_authentication(request):
+    if not request.user.is_authenticated:
+        raise exceptions.NotAuthenticated()
+
+
+def render(data, status=200, renderer=json_renderer):
+    content_type = renderer.media_type
+    if renderer.charset:
+        content_type = f'{content_type}; charset={renderer.charset}'
+    return HttpResponse(
+        renderer.render(data), status=status, content_type=content_type)
+
+
+def handle_exception(request, exc):
+    """Ответ с ошибкой в том же виде, что у APIView.handle_exception."""
+    response = exception_handler(exc, {'request': request})
+    rendered = render(
+        response.data, response.status_code,
+        getattr(request, 'accepted_renderer', json_renderer)
+    )
+    if isinstance(exc, (exceptions.NotAuthenticated,
+                        exceptions.AuthenticationFailed)):
+        rendered['WWW-Authenticate'] = (
+            request.authenticators[0].authenticate_header(request))
+    return rendered
+
+
+def as_view(handler, fallback, renderer_classes=(ORJSONRenderer,)):
+    """Асинхронное представление: GET и HEAD обрабатывает handler,
+    остальные методы — синхронное представление DRF fallback."""
+    fallback = sync_to_async(fallback)
+
+    async def view(http_request, *args, **kwargs):
+        if http_request.method not in ('GET', 'HEAD'):
+            return await fallback(http_request, *args, **kwargs)
+        request = Request(
+            http_request, authenticators=get_authenticators(),
+            negotiator=negotiator
+        )
+        try:
+            renderers = [renderer() for renderer in renderer_classes]
+            (request.accepted_renderer,
+             request.accepted_media_type) = negotiator.select_renderer(
+                request, renderers)
+            await authenticate(request)
+            return await handler(request, *args, **kwargs)
+        except (exceptions.APIException, Http404) as exc:
+            return handle_exception(request, exc)
+
+    view.csrf_exempt = True
+    return view
+
+
+def filter_recipes(request, queryset, tag_state=None):
+    filterset = RecipesFilter(
+        request.query_params, queryset=queryset, request=request,
+        tag_state=tag_state)
+    if not filterset.is_valid():
+        raise translate_validation(filterset.errors)
+    return filterset.qs
+
+
+async def afilter_recipes(request, queryset):
+    if MODEL_FILTERS.intersection(request.query_params):
+        return await sync_to_async(filter_recipes)(request, queryset)
+    # Фильтр тегов работает с полученным снимком: кеш может быть сброшен
+    # сигналом или по ttl, и повторное обращение к нему пошло бы в БД
+    # из цикла событий.
+    return filter_recipes(
+        request, queryset, tag_state=await tag_cache.aload())
+
+
+def get_recipes(request):
+    return Recipe.objects.with_related().with_user_flags(request.user)
+
+
+async def cached_for_anonymous(request, build, *parts):
+    """То же кеширование готового JSON, что и в
+    AnonymousRecipesCacheMixin, с общими ключами."""
+    if request.user.is_authenticated:
+        return render(await build())
+    key = recipes_cache_key(
+        request, *parts, generation=await aget_recipes_generation())
+    content = await cache.aget(key)
+    if content is None:
+        content = json_renderer.render(await build())
+        await cache.aset(key, content, RECIPES_CACHE_TIMEOUT)
+    return HttpResponse(content, content_type=json_renderer.media_type)
+
+
+async def recipe_list(request):
+    async def build():
+        paginator = CustomNumberPaginator()
+        recipes = await paginator.apaginate_queryset(
+            await afilter_recipes(request, get_recipes(request)), request)
+        serializer = RecipeReadSerializer(
+            recipes, many=True, context={'request': request})
+        return paginator.get_paginated_response(serializer.data).data
+    return await cached_for_anonymous(request, build, 'list', '')
+
+
+async def recipe_detail(request, pk):
+    async def build():
+        recipe = await get_recipes(request).filter(pk=pk).afirst()
+        if recipe is None:
+            raise Http404
+        return RecipeReadSerializer(recipe, context={'request': request}).data
+    return await cached_for_anonymous(request, build, 'retrieve', pk)
+
+
+async def download_shopping_cart(request):
+    require_authentication(request)
+    # С named=True aiterator() в Django 4.2 выполняет запрос в потоке,
+    # а у обычного values_list — сразу в цикле событий.
+    totals = RecipesViewSet().get_cart_totals(request.user).values_list(
+        'name', 'measurement_unit', 'amount', named=True)
+
+    async def ingredients():
+        async for name, measurement_unit, amount in totals.aiterator():
+            yield name, measurement_unit, format_amount(amount)
+
+    renderer = request.accepted_renderer
+    response = StreamingHttpResponse(
+        renderer.astream(ingredients()),
+        content_type=f'{renderer.media_type}; charset=utf-8'
+    )
+    response['Content-Disposition'] = (
+        f'attachment; filename="shopping_list.{renderer.format}"')
+    return response
+
+
+async def subscriptions(request):
+    require_authentication(request)
+    view = CustomUserViewSet(request=request)
+    recipes_limit = view.get_recipes_limit(request)
+    paginator = CustomNumberPaginator()
+    authors = await paginator.apaginate_queryset(
+        view.get_subscriptions_queryset(CustomUser.objects.filter(
+            subscrib_to__subscriber=request.user)),
+        request
+    )
+    view.attach_recipes(authors, recipes_limit, [
+        recipe async for recipe in view.get_authors_recipes(
+            authors, recipes_limit)
+    ])
+    serializer = SubscriptionSerializer(
+        authors, many=True, read_only=True, context={
+            'request': request,
+            'user': request.user,
+            'recipes_limit': recipes_limit
+        })
+    return render(
+        paginator.get_paginated_response(serializer.data).data)
+
+
+def catalogue_response(request, state, rows, *parts):
+    """Ответ справочника с ETag, как у condition() в views.py."""
+    etag = quote_etag(catalogue_etag(state, request, *parts))
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = render(rows)
+        response['ETag'] = etag
+    return patch_catalogue_cache_control(response)
+
+
+async def tag_list(request):
+    state = await tag_cache.aload()
+    return catalogue_response(request, state, state.rows)
+
+
+async def ingredient_list(request):
+    state = await ingredient_index.aload()
+    name = request.query_params.get('name', '')
+    rows = ingredient_index.startswith(name, state) if name else state.rows
+    return catalogue_response(request, state, rows, name.casefold())
+
+
+def get_urlpatterns(router_urls):
+    """Маршруты асинхронных представлений поверх маршрутов роутера DRF,
+    которые обрабатывают остальные методы."""
+    views = {pattern.name: pattern.callback for pattern in router_urls}
+    return [
+        path('recipes/',
+             as_view(recipe_list, views['recipes-list']),
+             name='recipes-list'),
+        path('recipes/<int:pk>/',
+             as_view(recipe_detail, views['recipes-detail']),
+             name='recipes-detail'),
+        path('recipes/download_shopping_cart/',
+             as_view(download_shopping_cart,
+                     views['recipes-get-a-list-to-shopping-cart'],
+                     SHOPPING_LIST_RENDERERS),
+             name='recipes-get-a-list-to-shopping-cart'),
+        path('users/subscriptions/',
+             as_view(subscriptions, views['users-get-user-subscriptions']),
+             name='users-get-user-subscriptions'),
+        path('tags/', as_view(tag_list, views['tags-list']),
+             name='tags-list'),
+        path('ingredients/',
+             as_view(ingredient_list, views['ingredients-list']),
+             name='ingredients-list'),
+    ]
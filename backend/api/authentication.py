@@ -0,0 +1,117 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import DEFERRED
+from django.utils.translation import gettext as _
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+
+from .models import CustomUser
+
+# Поля пользователя в кеше токенов: достаточно для аутентификации,
+# проверок прав и ответа /users/me/. Хеш пароля в кеш не попадает.
+USER_FIELDS = ('id', 'username', 'email', 'first_name', 'last_name',
+               'is_active', 'is_staff', 'is_superuser')
+
+
+def get_token_cache():
+    """Кеш токенов или None, если кеширование выключено."""
+    if settings.AUTH_TOKEN_CACHE is None:
+        return None
+    return caches[settings.AUTH_TOKEN_CACHE]
+
+
+def token_cache_key(key):
+    # В ключе кеша хранится хеш, а не сам токен.
+    return f'auth:token:{hashlib.sha256(key.encode()).hexdigest()}'
+
+
+def cached_values(key):
+    """Поля токена и пользователя, которые кладутся в кеш."""
+    return Token.objects.filter(key=key).values_list(
+        'created', *(f'user__{field}' for field in USER_FIELDS))
+
+
+def from_values(model, values):
+    """Экземпляр модели из значений полей, отсутствующие поля отложены."""
+    return model.from_db(model.objects.db, list(values), [
+        values.get(field.attname, DEFERRED)
+        for field in model._meta.concrete_fields
+    ])
+
+
+def build_token(key, values):
+    """Токен с пользователем из закешированных полей.
+
+    Остальные поля пользователя, включая счетчики и хеш пароля, отложены
+    и при обращении читаются из БД, а save() сохраняет только
+    загруженные поля, поэтому устаревшие значения в БД не попадут.
+    """
+    created, *user_values = values
+    user = from_values(CustomUser, dict(zip(USER_FIELDS, user_values)))
+    token = from_values(
+        Token, {'key': key, 'user_id': user.pk, 'created': created})
+    token.user = user
+    return token
+
+
+def get_token(key):
+    """Токен вместе с пользователем: из кеша или одним запросом к БД."""
+    cache, cache_key = get_token_cache(), token_cache_key(key)
+    values = None if cache is None else cache.get(cache_key)
+    if values is None:
+        values = cached_values(key).first()
+        if values is None:
+            return None
+        if cache is not None:
+            cache.set(cache_key, values, settings.AUTH_TOKEN_CACHE_TIMEOUT)
+    return build_token(key, values)
+
+
+async def aget_token(key):
+    cache, cache_key = get_token_cache(), token_cache_key(key)
+    values = None if cache is None else await cache.aget(cache_key)
+    if values is None:
+        values = await cached_values(key).afirst()
+        if values is None:
+            return None
+        if cache is not None:
+            await cache.aset(
+                cache_key, values, settings.AUTH_TOKEN_CACHE_TIMEOUT)
+    return build_token(key, values)
+
+
+def check_token(token):
+    if token is None:
+        raise AuthenticationFailed(_('Invalid token.'))
+    if not token.user.is_active:
+        raise AuthenticationFailed(_('User inactive or deleted.'))
+    return token.user, token
+
+
+def forget_tokens(keys):
+    cache = get_token_cache()
+    if cache is not None:
+        cache.delete_many([token_cache_key(key) for key in keys])
+
+
+def forget_user_tokens(user_id):
+    if get_token_cache() is None:
+        return
+    forget_tokens(Token.objects.filter(user_id=user_id).values_list(
+        'key', flat=True))
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication без запроса к БД при попадании в кеш.
+
+    Токен с пользователем хранится AUTH_TOKEN_CACHE_TIMEOUT секунд и
+    удаляется из кеша сигналами при выходе, удалении токена или
+    пользователя и сохранении пользователя, в том числе при смене пароля.
+    В кеше лежат только поля USER_FIELDS, а не экземпляр модели, поэтому
+    request.user не несет устаревших счетчиков и хеша пароля.
+    """
+    def authenticate_credentials(self, key):
+        return check_token(get_token(key))
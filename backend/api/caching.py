@@ -0,0 +1,103 @@
+import hashlib
+
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import patch_cache_control
+
+RECIPES_GENERATION_KEY = 'recipes:generation'
+RECIPES_CACHE_TIMEOUT = 60
+CATALOGUE_MAX_AGE = 60
+
+
+def get_recipes_generation():
+    generation = cache.get(RECIPES_GENERATION_KEY)
+    if generation is None:
+        cache.add(RECIPES_GENERATION_KEY, 1, timeout=None)
+        generation = cache.get(RECIPES_GENERATION_KEY, 1)
+    return generation
+
+
+async def aget_recipes_generation():
+    generation = await cache.aget(RECIPES_GENERATION_KEY)
+    if generation is None:
+        await cache.aadd(RECIPES_GENERATION_KEY, 1, timeout=None)
+        generation = await cache.aget(RECIPES_GENERATION_KEY, 1)
+    return generation
+
+
+def bump_recipes_generation():
+    """Делает недействительными все закешированные ответы по рецептам."""
+    try:
+        cache.incr(RECIPES_GENERATION_KEY)
+    except ValueError:
+        cache.set(RECIPES_GENERATION_KEY, 2, timeout=None)
+
+
+def recipes_cache_key(request, *parts, generation=None):
+    params = request.query_params
+    normalized = (
+        request.get_host(),
+        request.scheme,
+        *parts,
+        params.get('page', ''),
+        params.get('cursor'),
+        params.get('limit', ''),
+        params.get('author', ''),
+        params.get('search', '').strip(),
+        ','.join(sorted(set(params.getlist('tags')))),
+        params.get('tags_match', ''),
+    )
+    digest = hashlib.md5('|'.join(map(str, normalized)).encode()).hexdigest()
+    if generation is None:
+        generation = get_recipes_generation()
+    return f'recipes:{generation}:{digest}'
+
+
+class AnonymousRecipesCacheMixin:
+    """Кеширует готовые JSON-ответы списка и карточки рецепта для
+    анонимных пользователей.
+
+    Ключ включает номер поколения рецептов, который увеличивается
+    сигналами при любом изменении данных, попадающих в ответ.
+    """
+    def get_cached_response(self, request, handler, *args, **kwargs):
+        if (request.user.is_authenticated
+                or request.accepted_renderer.format != 'json'):
+            return handler(request, *args, **kwargs)
+        key = recipes_cache_key(request, self.action, kwargs.get('pk', ''))
+        content = cache.get(key)
+        if content is None:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            content = request.accepted_renderer.render(
+                response.data,
+                request.accepted_media_type,
+                self.get_renderer_context()
+            )
+            cache.set(key, content, RECIPES_CACHE_TIMEOUT)
+        return HttpResponse(
+            content, content_type=request.accepted_renderer.media_type)
+
+    def list(self, request, *args, **kwargs):
+        return self.get_cached_response(
+            request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.get_cached_response(
+            request, super().retrieve, *args, **kwargs)
+
+
+def catalogue_etag(catalogue, request, *parts):
+    """Строгий ETag ответа по версии справочника и параметрам запроса."""
+    normalized = (
+        catalogue.version,
+        request.accepted_renderer.format,
+        *parts,
+    )
+    return hashlib.md5('|'.join(map(str, normalized)).encode()).hexdigest()
+
+
+def patch_catalogue_cache_control(response):
+    patch_cache_control(response, public=True, max_age=CATALOGUE_MAX_AGE)
+    return response
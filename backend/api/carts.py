@@ -0,0 +1,125 @@
+from collections import defaultdict
+from contextlib import contextmanager
+from decimal import Decimal
+
+from .models import (CartIngredientTotal, CustomUser, IngredientRecipe,
+                     ShoppigCart)
+from .units import normalize
+
+
+def lock_cart(user_id):
+    """Блокирует строку пользователя до конца транзакции, чтобы изменения
+    его списка покупок и итогов по нему выполнялись по очереди."""
+    list(CustomUser.objects.select_for_update().filter(
+        pk=user_id).values_list('pk', flat=True))
+
+
+def recipe_vectors(recipe_ids):
+    """Ингредиенты рецептов в базовых единицах:
+    {id рецепта: {(название, единица): количество}}."""
+    vectors = defaultdict(lambda: defaultdict(Decimal))
+    for recipe_id, name, measurement_unit, amount in (
+            IngredientRecipe.objects.filter(recipe_id__in=recipe_ids)
+            .values_list('recipe_id', 'ingredient__name',
+                         'ingredient__measurement_unit', 'amount')):
+        unit, amount = normalize(measurement_unit, amount)
+        vectors[recipe_id][name, unit] += amount
+    return vectors
+
+
+def combine(vectors, sign):
+    """Складывает векторы рецептов в изменение итогов
+    {(название, единица): (количество, число рецептов)}."""
+    delta = defaultdict(lambda: (Decimal(0), 0))
+    for vector in vectors:
+        for key, amount in vector.items():
+            total, recipes = delta[key]
+            delta[key] = (total + sign * amount, recipes + sign)
+    return delta
+
+
+def apply(user_ids, delta):
+    """Прибавляет изменение к итогам пользователей."""
+    if not user_ids or not delta:
+        return
+    existing = {
+        (total.user_id, total.name, total.measurement_unit): total
+        for total in CartIngredientTotal.objects.filter(
+            user_id__in=user_ids, name__in={name for name, _ in delta})
+    }
+    changed, emptied = [], []
+    for user_id in user_ids:
+        for (name, unit), (amount, recipes) in delta.items():
+            total = existing.get((user_id, name, unit))
+            if total is not None:
+                amount += total.amount
+                recipes += total.recipes
+            if recipes > 0:
+                changed.append(CartIngredientTotal(
+                    user_id=user_id, name=name, measurement_unit=unit,
+                    amount=amount, recipes=recipes))
+            elif total is not None:
+                emptied.append(total.pk)
+    CartIngredientTotal.objects.bulk_create(
+        changed,
+        update_conflicts=True,
+        unique_fields=('user', 'name', 'measurement_unit'),
+        update_fields=('amount', 'recipes')
+    )
+    CartIngredientTotal.objects.filter(pk__in=emptied).delete()
+
+
+def add_to_totals(user_id, recipe_ids):
+    apply([user_id], combine(recipe_vectors(recipe_ids).values(), 1))
+
+
+def remove_from_totals(user_id, recipe_ids):
+    apply([user_id], combine(recipe_vectors(recipe_ids).values(), -1))
+
+
+@contextmanager
+def track_recipe(recipe_id):
+    """Переносит в итоги списков покупок изменения ингредиентов рецепта,
+    сделанные внутри блока."""
+    user_ids = list(CustomUser.objects.select_for_update(of=('self',)).filter(
+        shoppigcart__recipe_id=recipe_id).order_by('pk').values_list(
+        'pk', flat=True))
+    if not user_ids:
+        yield
+        return
+    old = recipe_vectors([recipe_id])[recipe_id]
+    yield
+    new = recipe_vectors([recipe_id])[recipe_id]
+    delta = {
+        key: (new.get(key, 0) - old.get(key, 0),
+              (key in new) - (key in old))
+        for key in old.keys() | new.keys()
+        if new.get(key) != old.get(key)
+    }
+    apply(user_ids, delta)
+
+
+def rebuild(user_ids=None):
+    """Пересчитывает итоги списков покупок с нуля."""
+    carts = ShoppigCart.objects.all()
+    totals = CartIngredientTotal.objects.all()
+    if user_ids is not None:
+        carts = carts.filter(user_id__in=user_ids)
+        totals = totals.filter(user_id__in=user_ids)
+    totals.delete()
+    recipes_by_user = defaultdict(list)
+    for user_id, recipe_id in carts.values_list(
+            'user_id', 'recipe_id').iterator():
+        recipes_by_user[user_id].append(recipe_id)
+    vectors = recipe_vectors(carts.values('recipe_id'))
+    CartIngredientTotal.objects.bulk_create(
+        (
+            CartIngredientTotal(
+                user_id=user_id, name=name, measurement_unit=unit,
+                amount=amount, recipes=recipes)
+            for user_id, recipe_ids in recipes_by_user.items()
+            for (name, unit), (amount, recipes) in combine(
+                (vectors[pk] for pk in recipe_ids), 1).items()
+        ),
+        batch_size=5000
+    )
@@ -0,0 +1,60 @@
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from .models import CustomUser, Favorite, Recipe, ShoppigCart, Subscription
+
+COUNTERS = (
+    (Favorite, 'recipe', Recipe, 'favorites_count'),
+    (ShoppigCart, 'recipe', Recipe, 'in_carts_count'),
+    (Recipe, 'author', CustomUser, 'recipes_count'),
+    (Subscription, 'subscrib_to', CustomUser, 'followers_count'),
+)
+
+
+def change_counter(target, pk, counter, delta):
+    """Атомарно меняет счетчик на delta одним UPDATE."""
+    target.objects.filter(pk=pk).update(**{counter: F(counter) + delta})
+
+
+def recount(target, counter, source, field, pks=None):
+    """Пересчитывает счетчик по исходной таблице одним UPDATE."""
+    targets = target.objects.all()
+    if pks is not None:
+        targets = targets.filter(pk__in=pks)
+    return targets.update(**{counter: Coalesce(Subquery(
+        source.objects.filter(**{field: OuterRef('pk')}).order_by().values(
+            field).annotate(total=Count('pk')).values('total')
+    ), Value(0))})
+
+
+def recount_all():
+    for source, field, target, counter in COUNTERS:
+        recount(target, counter, source, field)
+
+
+def missing_rows(source, owner, owner_id, field, pks):
+    """Блокирует строку пользователя owner_id до конца транзакции и
+    возвращает pks, для которых у него еще нет строки source.
+
+    Пока блокировка держится, параллельный запрос того же пользователя
+    ждет, поэтому добавлены будут ровно возвращенные строки.
+    """
+    list(CustomUser.objects.select_for_update().filter(
+        pk=owner_id).values_list('pk', flat=True))
+    existing = set(source.objects.filter(**{
+        owner: owner_id, f'{field}_id__in': pks
+    }).values_list(f'{field}_id', flat=True))
+    return [pk for pk in dict.fromkeys(pks) if pk not in existing]
+
+
+def increment_counters(source, pks):
+    """Увеличивает на 1 зависящие от source счетчики объектов pks.
+
+    Нужен после bulk_create, который не отправляет post_save.
+    """
+    if not pks:
+        return
+    for counter_source, field, target, counter in COUNTERS:
+        if counter_source is source:
+            target.objects.filter(pk__in=pks).update(
+                **{counter: F(counter) + 1})
@@ -27,3 +27,29 @@ class Base64ImageField(serializers.ImageField):
             data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
 
         return super().to_internal_value(data)
+
+
+class ImageRenditionField(serializers.Field):
+    """Ссылка на уменьшенную копию изображения рецепта.
+
+    Пока копия не создана, возвращает ссылку на исходное изображение.
+    """
+    def __init__(self, rendition, **kwargs):
+        self.rendition = rendition
+        kwargs['source'] = '*'
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, recipe):
+        if not recipe.image:
+            return None
+        renditions = recipe.image_renditions
+        if renditions.get('source') == recipe.image.name and renditions.get(
+                self.rendition):
+            url = recipe.image.storage.url(renditions[self.rendition])
+        else:
+            url = recipe.image.url
+        request = self.context.get('request', None)
+        if request is not None:
+            return request.build_absolute_uri(url)
+        return url
@@ -1,21 +1,55 @@
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            TrigramSimilarity)
+from django.db import connection
+from django.db.models import F, Q
 from django_filters import rest_framework as filters
 
-from .models import Favorite, Recipe, ShoppigCart, Tag
+from .indexes import tag_cache
+from .models import Favorite, Recipe, ShoppigCart
+
+TAGS_MATCH_CHOICES = (
+    ('any', 'Любой из тегов'),
+    ('all', 'Все теги'),
+)
+
+
+def get_tag_choices(state=None):
+    rows = state.rows if state is not None else tag_cache.all()
+    return [(tag['slug'], tag['name']) for tag in rows]
 
 
 class RecipesFilter(filters.FilterSet):
-    tags = filters.ModelMultipleChoiceFilter(
-        field_name='tags__slug',
-        to_field_name='slug',
-        queryset=Tag.objects.all()
-    )
+    tags = filters.MultipleChoiceFilter(
+        choices=get_tag_choices, method='filter_tags')
+    tags_match = filters.ChoiceFilter(
+        choices=TAGS_MATCH_CHOICES, method='filter_tags_match')
     is_favorited = filters.BooleanFilter(method='filter_is_favorited')
     is_in_shopping_cart = filters.BooleanFilter(method='filter_shopping_cart')
+    search = filters.CharFilter(method='filter_search')
 
     class Meta:
         model = Recipe
         fields = ['author', 'tags', 'is_favorited']
 
+    def __init__(self, *args, tag_state=None, **kwargs):
+        """tag_state — снимок tag_cache, по которому фильтр проверяет и
+        применяет теги, не обращаясь к кешу повторно."""
+        super().__init__(*args, **kwargs)
+        self.tag_state = tag_state
+        if tag_state is not None:
+            self.filters['tags'].extra['choices'] = get_tag_choices(
+                tag_state)
+
+    def filter_tags(self, queryset, filter_name, value):
+        return queryset.with_tags(
+            tag_cache.mask(value, self.tag_state),
+            match_all=self.form.cleaned_data.get('tags_match') == 'all'
+        )
+
+    def filter_tags_match(self, queryset, filter_name, value):
+        # Учитывается в filter_tags.
+        return queryset
+
     def filter_is_favorited(self, queryset, filter_name, value):
         if value and self.request.user.is_authenticated:
             user = self.request.user
@@ -31,3 +65,18 @@ class RecipesFilter(filters.FilterSet):
                 user=user).values_list('recipe', flat=True)
             queryset = queryset.filter(id__in=recipes_in_shopping_cart)
         return queryset
+
+    def filter_search(self, queryset, filter_name, value):
+        value = value.strip()
+        if not value:
+            return queryset
+        if connection.vendor != 'postgresql':
+            return queryset.filter(
+                Q(name__icontains=value) | Q(text__icontains=value))
+        query = SearchQuery(value, config='russian', search_type='websearch')
+        return queryset.filter(
+            Q(search_vector=query) | Q(name__trigram_similar=value)
+        ).annotate(
+            rank=SearchRank(F('search_vector'), query),
+            similarity=TrigramSimilarity('name', value)
+        ).order_by('-rank', '-similarity', '-created_at', '-id')
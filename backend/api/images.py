@@ -0,0 +1,85 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from pathlib import PurePosixPath
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections
+from PIL import Image, ImageOps
+
+from .caching import bump_recipes_generation
+from .models import Recipe
+
+RENDITIONS = {
+    'thumb': ((480, 480), 'JPEG'),
+    'thumb_webp': ((480, 480), 'WEBP'),
+    'detail': ((1200, 1200), 'JPEG'),
+    'detail_webp': ((1200, 1200), 'WEBP'),
+}
+RENDITIONS_DIR = 'api/images/renditions/'
+EXTENSIONS = {'JPEG': 'jpg', 'WEBP': 'webp'}
+SAVE_OPTIONS = {
+    'JPEG': {'quality': 82, 'optimize': True, 'progressive': True},
+    'WEBP': {'quality': 80, 'method': 6},
+}
+
+logger = logging.getLogger(__name__)
+executor = ThreadPoolExecutor(max_workers=2)
+
+
+def needs_renditions(recipe):
+    return bool(recipe.image) and (
+        recipe.image_renditions.get('source') != recipe.image.name)
+
+
+def render(source, size, image_format):
+    image = source.copy()
+    image.thumbnail(size, Image.LANCZOS)
+    if image_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    buffer = BytesIO()
+    image.save(buffer, image_format, **SAVE_OPTIONS[image_format])
+    return buffer.getvalue()
+
+
+def generate_renditions(recipe):
+    """Создает уменьшенные копии изображения рецепта и сохраняет их
+    имена в поле image_renditions."""
+    with recipe.image.open('rb') as file:
+        source = ImageOps.exif_transpose(Image.open(file))
+        source.load()
+    stem = PurePosixPath(recipe.image.name).stem
+    renditions = {'source': recipe.image.name}
+    for name, (size, image_format) in RENDITIONS.items():
+        renditions[name] = default_storage.save(
+            f'{RENDITIONS_DIR}{stem}_{name.removesuffix("_webp")}.'
+            f'{EXTENSIONS[image_format]}',
+            ContentFile(render(source, size, image_format))
+        )
+    old_renditions = recipe.image_renditions
+    Recipe.objects.filter(pk=recipe.pk).update(image_renditions=renditions)
+    recipe.image_renditions = renditions
+    bump_recipes_generation()
+    for name in RENDITIONS:
+        if old_renditions.get(name):
+            default_storage.delete(old_renditions[name])
+    return renditions
+
+
+def generate_renditions_by_id(recipe_id):
+    try:
+        recipe = Recipe.objects.filter(pk=recipe_id).only(
+            'id', 'image', 'image_renditions').first()
+        if recipe is not None and needs_renditions(recipe):
+            generate_renditions(recipe)
+    except Exception:
+        logger.exception(
+            'Не удалось создать копии изображения рецепта %s', recipe_id)
+    finally:
+        connections.close_all()
+
+
+def schedule_renditions(recipe_id):
+    """Ставит генерацию копий изображения в фоновый пул потоков."""
+    return executor.submit(generate_renditions_by_id, recipe_id)
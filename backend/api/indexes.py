@@ -0,0 +1,306 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import Counter, defaultdict, namedtuple
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.db import connections
+from django.utils import timezone
+
+from .models import Ingredient, IngredientRecipe, Recipe, Tag
+
+CATALOGUE_TTL = 300
+# Как часто индекс ингредиентов рецептов подхватывает изменения других
+# процессов и с каким запасом по времени, чтобы не пропустить рецепты,
+# транзакции которых завершились позже записанного modified_at.
+RECIPE_INDEX_SYNC_INTERVAL = 5
+RECIPE_INDEX_SYNC_OVERLAP = timedelta(seconds=60)
+BATCH_SIZE = 10000
+
+logger = logging.getLogger(__name__)
+
+CatalogueState = namedtuple(
+    'CatalogueState', ('built_at', 'rows', 'version', 'index'))
+IngredientMatch = namedtuple(
+    'IngredientMatch', ('recipe_id', 'matched', 'required'))
+
+
+class CatalogueCache:
+    """Снимок небольшого справочника в памяти процесса.
+
+    Строится лениво из таблицы model, сбрасывается сигналами при
+    изменении записей и перестраивается не реже раза в ttl секунд,
+    чтобы подхватывать изменения, сделанные другими процессами.
+    Поле version — хеш содержимого, одинаковый во всех процессах
+    для одинаковых данных.
+    """
+    model = None
+    fields = ()
+
+    def __init__(self, ttl=CATALOGUE_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._state = None
+
+    def invalidate(self):
+        self._state = None
+
+    def prepare(self, rows):
+        """Возвращает упорядоченные строки и вспомогательный индекс."""
+        return rows, None
+
+    def _build(self):
+        rows, index = self.prepare([
+            dict(zip(self.fields, values))
+            for values in self.model.objects.order_by('pk').values_list(
+                *self.fields)
+        ])
+        version = hashlib.md5(
+            json.dumps(rows, sort_keys=True).encode()).hexdigest()
+        return CatalogueState(time.monotonic(), rows, version, index)
+
+    def _is_stale(self, state):
+        return state is None or time.monotonic() - state.built_at > self.ttl
+
+    def _get_state(self):
+        state = self._state
+        if self._is_stale(state):
+            with self._lock:
+                state = self._state
+                if self._is_stale(state):
+                    state = self._state = self._build()
+        return state
+
+    async def aload(self):
+        """Возвращает снимок для асинхронных представлений.
+
+        Запрос к БД выполняется в потоке и только если снимок устарел.
+        """
+        state = self._state
+        if self._is_stale(state):
+            state = await sync_to_async(self._get_state)()
+        return state
+
+    @property
+    def version(self):
+        return self._get_state().version
+
+    def all(self):
+        return self._get_state().rows
+
+
+class IngredientPrefixIndex(CatalogueCache):
+    """Индекс ингредиентов для поиска по началу названия: отсортированный
+    массив названий в нижнем регистре, по которому ищет bisect."""
+    model = Ingredient
+    fields = ('id', 'name', 'measurement_unit')
+
+    def prepare(self, rows):
+        rows = sorted(
+            rows, key=lambda row: (row['name'].casefold(), row['id']))
+        return rows, [row['name'].casefold() for row in rows]
+
+    def startswith(self, prefix, state=None):
+        state = state or self._get_state()
+        keys = state.index
+        prefix = prefix.casefold()
+        start = bisect_left(keys, prefix)
+        end = bisect_left(keys, prefix + '\U0010ffff', start)
+        return state.rows[start:end]
+
+
+class TagCache(CatalogueCache):
+    """Список тегов и биты тегов в Recipe.tags_mask по слагам."""
+    model = Tag
+    fields = ('id', 'name', 'color', 'slug', 'bit')
+
+    def prepare(self, rows):
+        bits = {}
+        for row in rows:
+            bits[row['slug']] = 1 << row.pop('bit')
+        return rows, bits
+
+    def mask(self, slugs, state=None):
+        bits = (state or self._get_state()).index
+        mask = 0
+        for slug in slugs:
+            mask |= bits[slug]
+        return mask
+
+
+class RecipeIngredientIndex:
+    """Обратный индекс ингредиентов рецептов в памяти процесса.
+
+    Для каждого ингредиента хранит отсортированный массив id рецептов,
+    для каждого рецепта — массив id его ингредиентов. Массивы не
+    изменяются на месте, а заменяются новыми, поэтому поиск читает
+    индекс без блокировки.
+
+    Первый раз строится лениво в запросе, а раз в ttl секунд целиком
+    перестраивается в фоновом потоке, пока поиск читает прежний. Между
+    перестройками изменения этого процесса применяются сигналами после
+    коммита, а рецепты, измененные другими процессами, подхватываются
+    по modified_at не реже раза в sync_interval секунд. Рецепты,
+    удаленные другими процессами, остаются в индексе до перестройки,
+    их отбрасывает выборка страницы из БД.
+    """
+    def __init__(self, ttl=CATALOGUE_TTL,
+                 sync_interval=RECIPE_INDEX_SYNC_INTERVAL):
+        self.ttl = ttl
+        self.sync_interval = sync_interval
+        self._lock = threading.Lock()
+        self._postings = None
+        self._recipes = None
+        self._built_at = self._synced_at = 0
+        self._synced_since = None
+        # Рецепты, обновленные во время фоновой перестройки; None, пока
+        # перестройка не идет.
+        self._pending = None
+
+    def _scan(self):
+        started = timezone.now()
+        postings = defaultdict(list)
+        recipes = defaultdict(list)
+        for recipe_id, ingredient_id in IngredientRecipe.objects.order_by(
+                'recipe_id').values_list(
+                'recipe_id', 'ingredient_id').iterator(chunk_size=BATCH_SIZE):
+            postings[ingredient_id].append(recipe_id)
+            recipes[recipe_id].append(ingredient_id)
+        return started, {
+            ingredient_id: array('I', recipe_ids)
+            for ingredient_id, recipe_ids in postings.items()
+        }, {
+            recipe_id: array('I', ingredients)
+            for recipe_id, ingredients in recipes.items()
+        }
+
+    def _install(self, started, postings, recipes):
+        self._postings, self._recipes = postings, recipes
+        self._built_at = self._synced_at = time.monotonic()
+        self._synced_since = started
+
+    def _rebuild(self):
+        """Строит новый индекс без блокировки и подменяет им прежний,
+        применяя рецепты, обновленные за время построения."""
+        scanned = self._scan()
+        with self._lock:
+            self._install(*scanned)
+            pending, self._pending = self._pending, None
+            if pending:
+                self._apply(self._load(list(pending)))
+
+    def _rebuild_in_background(self):
+        try:
+            self._rebuild()
+        except Exception:
+            logger.exception('Не удалось перестроить индекс ингредиентов')
+            with self._lock:
+                # Следующая попытка — через ttl секунд.
+                self._built_at = time.monotonic()
+                self._pending = None
+        finally:
+            connections.close_all()
+
+    def _load(self, recipe_ids):
+        """Текущие ингредиенты рецептов, у удаленных — пустой массив."""
+        recipes = {recipe_id: array('I') for recipe_id in recipe_ids}
+        for recipe_id, ingredient_id in IngredientRecipe.objects.filter(
+                recipe_id__in=recipe_ids).values_list(
+                'recipe_id', 'ingredient_id'):
+            recipes[recipe_id].append(ingredient_id)
+        return recipes
+
+    def _apply(self, recipes):
+        postings = self._postings
+        for recipe_id, ingredients in recipes.items():
+            old = set(self._recipes.get(recipe_id, ()))
+            new = set(ingredients)
+            for ingredient_id in old - new:
+                recipe_ids = postings[ingredient_id]
+                index = bisect_left(recipe_ids, recipe_id)
+                postings[ingredient_id] = (
+                    recipe_ids[:index] + recipe_ids[index + 1:])
+            for ingredient_id in new - old:
+                recipe_ids = postings.get(ingredient_id, array('I'))
+                index = bisect_left(recipe_ids, recipe_id)
+                postings[ingredient_id] = (
+                    recipe_ids[:index] + array('I', (recipe_id,))
+                    + recipe_ids[index:])
+            if ingredients:
+                self._recipes[recipe_id] = ingredients
+            else:
+                self._recipes.pop(recipe_id, None)
+
+    def _sync(self):
+        started = timezone.now()
+        self._apply(self._load(list(Recipe.objects.filter(
+            modified_at__gte=self._synced_since - RECIPE_INDEX_SYNC_OVERLAP
+        ).values_list('pk', flat=True))))
+        self._synced_at = time.monotonic()
+        self._synced_since = started
+
+    def load(self):
+        """Строит индекс, если его еще нет. Если пора, запускает фоновую
+        перестройку или синхронизирует индекс."""
+        now = time.monotonic()
+        if (self._postings is not None
+                and now - self._synced_at <= self.sync_interval
+                and (now - self._built_at <= self.ttl
+                     or self._pending is not None)):
+            return
+        with self._lock:
+            now = time.monotonic()
+            if self._postings is None:
+                self._install(*self._scan())
+                return
+            if now - self._built_at > self.ttl and self._pending is None:
+                self._pending = set()
+                threading.Thread(
+                    target=self._rebuild_in_background,
+                    name='recipe-ingredient-index', daemon=True).start()
+            if now - self._synced_at > self.sync_interval:
+                self._sync()
+
+    def refresh(self, recipe_ids):
+        """Обновляет рецепты в уже построенном индексе."""
+        if self._postings is None:
+            return
+        with self._lock:
+            self._apply(self._load(recipe_ids))
+            if self._pending is not None:
+                self._pending.update(recipe_ids)
+
+    def search(self, ingredient_ids, max_missing=None):
+        """Рецепты хотя бы с одним из ингредиентов: по убыванию доли
+        имеющихся ингредиентов рецепта, затем по числу недостающих,
+        по числу имеющихся и от новых к старым."""
+        self.load()
+        postings, recipes = self._postings, self._recipes
+        matched = Counter()
+        for ingredient_id in set(ingredient_ids):
+            matched.update(postings.get(ingredient_id, ()))
+        matches = []
+        for recipe_id, count in matched.items():
+            required = len(recipes.get(recipe_id, ()))
+            if required < count:
+                # Рецепт изменился во время поиска.
+                continue
+            if max_missing is None or required - count <= max_missing:
+                matches.append(IngredientMatch(recipe_id, count, required))
+        matches.sort(key=lambda match: (
+            -match.matched / match.required,
+            match.required - match.matched,
+            -match.matched,
+            -match.recipe_id
+        ))
+        return matches
+
+
+ingredient_index = IngredientPrefixIndex()
+recipe_ingredient_index = RecipeIngredientIndex()
+tag_cache = TagCache()
@@ -0,0 +1,282 @@
+import json
+import re
+import statistics
+import subprocess
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from urllib.request import Request, urlopen
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count, Q
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+
+from ...models import CustomUser, Ingredient, IngredientRecipe, Recipe, Tag
+
+SERVER_TIMING_QUERIES = re.compile(r'db;[^,]*desc="(\d+) queries"')
+
+
+def parse_queries(timing):
+    """Число запросов к БД из заголовка Server-Timing."""
+    match = SERVER_TIMING_QUERIES.search(timing)
+    return int(match.group(1)) if match else None
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, round(fraction * (len(ordered) - 1)))
+    return ordered[index]
+
+
+class Command(BaseCommand):
+    help = ('Прогоняет все маршруты API через тестовый клиент Django или '
+            'запущенный сервер и сохраняет задержки, число SQL-запросов '
+            'и пропускную способность в JSON.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument(
+            '--url', help='Адрес запущенного сервера, например '
+                          'http://127.0.0.1:8000; по умолчанию запросы '
+                          'выполняются тестовым клиентом в этом процессе')
+        parser.add_argument(
+            '--output', default='benchmark-results.json',
+            help='Файл для сохранения результатов')
+        parser.add_argument(
+            '--compare', help='Файл с результатами предыдущего прогона')
+        parser.add_argument(
+            '--only', help='Регулярное выражение для выбора сценариев')
+
+    def get_fixtures(self):
+        user = CustomUser.objects.order_by('-followers_count').filter(
+            subscriber__isnull=False).first()
+        if user is None or not Recipe.objects.exists():
+            raise CommandError(
+                'Нет данных для прогона, выполните seed_benchmark_data')
+        token, _ = Token.objects.get_or_create(user=user)
+        return {
+            'token': token.key,
+            'user': user.pk,
+            'author': Recipe.objects.values_list(
+                'author_id', flat=True).first(),
+            'recipe': Recipe.objects.exclude(
+                Q(favorite_recipe__user=user)
+                | Q(shoppigcart__user=user)).values_list(
+                'pk', flat=True).first(),
+            'unsubscribed': CustomUser.objects.exclude(
+                Q(pk=user.pk) | Q(subscrib_to__subscriber=user)
+            ).values_list('pk', flat=True).first(),
+            'tag': Tag.objects.values_list('slug', flat=True).first(),
+            'tag_id': Tag.objects.values_list('pk', flat=True).first(),
+            'ingredient': Ingredient.objects.values_list(
+                'pk', flat=True).first(),
+            'deep_page': max(Recipe.objects.count() // 6 - 1, 1),
+            'pantry': ','.join(map(str, IngredientRecipe.objects.values(
+                'ingredient_id').annotate(recipes=Count('pk')).order_by(
+                '-recipes').values_list('ingredient_id', flat=True)[:10])),
+        }
+
+    def get_scenarios(self, fixtures):
+        """Сценарии: (название, методы, путь, нужна ли авторизация).
+
+        Если методов несколько, они выполняются по очереди, например
+        добавление и удаление из избранного, чтобы каждый запрос был
+        успешным и состояние базы не менялось после прогона.
+        """
+        recipe = fixtures['recipe']
+        return [
+            ('recipes list anonymous', 'GET', '/api/recipes/', False),
+            ('recipes list', 'GET', '/api/recipes/', True),
+            ('recipes list limit=100', 'GET', '/api/recipes/?limit=100',
+             True),
+            ('recipes deep page', 'GET',
+             f'/api/recipes/?page={fixtures["deep_page"]}', True),
+            ('recipes cursor', 'GET', '/api/recipes/?cursor=', True),
+            ('recipes by tag', 'GET',
+             f'/api/recipes/?tags={fixtures["tag"]}', True),
+            ('recipes by author', 'GET',
+             f'/api/recipes/?author={fixtures["author"]}', True),
+            ('recipes favorited', 'GET', '/api/recipes/?is_favorited=1',
+             True),
+            ('recipes feed', 'GET', '/api/recipes/feed/', True),
+            ('recipes search', 'GET', '/api/recipes/?search=суп', True),
+            ('recipes by ingredients', 'GET',
+             f'/api/recipes/by_ingredients/?ids={fixtures["pantry"]}', True),
+            ('recipe detail', 'GET', f'/api/recipes/{recipe}/', True),
+            ('recipe similar', 'GET', f'/api/recipes/{recipe}/similar/',
+             True),
+            ('shopping list txt', 'GET',
+             '/api/recipes/download_shopping_cart/', True),
+            ('shopping list csv', 'GET',
+             '/api/recipes/download_shopping_cart/?format=csv', True),
+            ('favorite', 'POST DELETE',
+             f'/api/recipes/{recipe}/favorite/', True),
+            ('shopping cart', 'POST DELETE',
+             f'/api/recipes/{recipe}/shopping_cart/', True),
+            ('subscribe', 'POST DELETE',
+             f'/api/users/{fixtures["unsubscribed"]}/subscribe/', True),
+            ('users list', 'GET', '/api/users/', True),
+            ('user detail', 'GET', f'/api/users/{fixtures["author"]}/',
+             True),
+            ('users me', 'GET', '/api/users/me/', True),
+            ('subscriptions', 'GET',
+             '/api/users/subscriptions/?recipes_limit=3', True),
+            ('tags list', 'GET', '/api/tags/', False),
+            ('tag detail', 'GET', f'/api/tags/{fixtures["tag_id"]}/', False),
+            ('ingredients list', 'GET', '/api/ingredients/', False),
+            ('ingredients prefix', 'GET', '/api/ingredients/?name=сол',
+             False),
+            ('ingredient detail', 'GET',
+             f'/api/ingredients/{fixtures["ingredient"]}/', False),
+        ]
+
+    def make_client_request(self, client, token):
+        def request(method, path, auth):
+            headers = {}
+            if auth:
+                headers['HTTP_AUTHORIZATION'] = f'Token {token}'
+            response = getattr(client, method.lower())(path, **headers)
+            queries = parse_queries(response.get('Server-Timing', ''))
+            if response.streaming:
+                # Заголовок отправлен до отдачи тела, запросы потока
+                # считаются отдельно.
+                with CaptureQueriesContext(connection) as captured:
+                    b''.join(response.streaming_content)
+                if queries is not None:
+                    queries += len(captured)
+            return response.status_code, queries
+        return request
+
+    def make_http_request(self, base_url, token):
+        def request(method, path, auth):
+            headers = {'Authorization': f'Token {token}'} if auth else {}
+            http_request = Request(
+                base_url.rstrip('/') + path, method=method, headers=headers)
+            try:
+                with urlopen(http_request) as response:
+                    response.read()
+                    return response.status, parse_queries(
+                        response.headers.get('Server-Timing', ''))
+            except OSError as error:
+                status = getattr(error, 'code', 0)
+                headers = getattr(error, 'headers', None) or {}
+                return status, parse_queries(
+                    headers.get('Server-Timing', ''))
+        return request
+
+    def run_scenario(self, request, methods, path, auth, count, warmup):
+        for _ in range(warmup):
+            for method in methods:
+                request(method, path, auth)
+        latencies = {method: [] for method in methods}
+        queries = {method: [] for method in methods}
+        statuses = {method: set() for method in methods}
+        started = time.perf_counter()
+        for _ in range(count):
+            for method in methods:
+                request_started = time.perf_counter()
+                status, query_count = request(method, path, auth)
+                latencies[method].append(
+                    (time.perf_counter() - request_started) * 1000)
+                statuses[method].add(status)
+                if query_count is not None:
+                    queries[method].append(query_count)
+        elapsed = time.perf_counter() - started
+        return {
+            method: {
+                'method': method,
+                'path': path,
+                'statuses': sorted(statuses[method]),
+                'p50_ms': round(percentile(latencies[method], 0.50), 3),
+                'p95_ms': round(percentile(latencies[method], 0.95), 3),
+                'p99_ms': round(percentile(latencies[method], 0.99), 3),
+                'mean_ms': round(statistics.fmean(latencies[method]), 3),
+                'queries': (round(statistics.fmean(queries[method]), 2)
+                            if queries[method] else None),
+                'rps': round(count * len(methods) / elapsed, 1),
+            }
+            for method in methods
+        }
+
+    def get_commit(self):
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'],
+                capture_output=True, text=True, check=True,
+                cwd=settings.BASE_DIR
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    def handle(self, *args, **options):
+        fixtures = self.get_fixtures()
+        if options['url']:
+            request = self.make_http_request(
+                options['url'], fixtures['token'])
+        else:
+            host = next(
+                (host for host in settings.ALLOWED_HOSTS
+                 if host and host != '*' and not host.startswith('.')),
+                'testserver'
+            )
+            request = self.make_client_request(
+                Client(SERVER_NAME=host), fixtures['token'])
+
+        only = re.compile(options['only']) if options['only'] else None
+        results = {}
+        for name, method, path, auth in self.get_scenarios(fixtures):
+            if only and not only.search(name):
+                continue
+            methods = method.split()
+            measured = self.run_scenario(
+                request, methods, path, auth,
+                options['requests'], options['warmup'])
+            for method, result in measured.items():
+                label = f'{name} [{method}]' if len(methods) > 1 else name
+                results[label] = result
+                self.stdout.write(
+                    f'{label:<28} p50 {result["p50_ms"]:>8.2f} ms  '
+                    f'p95 {result["p95_ms"]:>8.2f} ms  '
+                    f'p99 {result["p99_ms"]:>8.2f} ms  '
+                    f'queries {result["queries"]!s:>6}  '
+                    f'{result["rps"]:>8.1f} req/s  {result["statuses"]}'
+                )
+
+        report = {
+            'commit': self.get_commit(),
+            'created_at': datetime.now(timezone.utc).isoformat(),
+            'database': connection.vendor,
+            'target': options['url'] or 'django.test.Client',
+            'requests': options['requests'],
+            'recipes': Recipe.objects.count(),
+            'users': CustomUser.objects.count(),
+            'results': results,
+        }
+        Path(options['output']).write_text(
+            json.dumps(report, ensure_ascii=False, indent=2))
+        self.stdout.write(self.style.SUCCESS(
+            f'Результаты сохранены в {options["output"]}'))
+        if options['compare']:
+            self.compare(report, json.loads(
+                Path(options['compare']).read_text()))
+
+    def compare(self, current, previous):
+        self.stdout.write(
+            f'Сравнение с {previous.get("commit")} '
+            f'({previous.get("created_at")}):')
+        for name, result in current['results'].items():
+            old = previous['results'].get(name)
+            if old is None:
+                continue
+            change = (result['p50_ms'] - old['p50_ms']) / max(
+                old['p50_ms'], 1e-9) * 100
+            self.stdout.write(
+                f'{name:<28} p50 {old["p50_ms"]:>8.2f} -> '
+                f'{result["p50_ms"]:>8.2f} ms ({change:+.0f}%)  '
+                f'queries {old["queries"]} -> {result["queries"]}'
+            )
@@ -0,0 +1,151 @@
+import json
+import statistics
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import RequestFactory
+from rest_framework.renderers import JSONRenderer
+
+from ...models import CustomUser, Recipe
+from ...renderers import ORJSONRenderer
+from ...serializers import RecipeReadSerializer, RecipeSerializer
+from .benchmark_api import Command as ApiBenchmark
+
+IMPLEMENTATIONS = {
+    'drf': (RecipeSerializer, JSONRenderer()),
+    'fast': (RecipeReadSerializer, ORJSONRenderer()),
+}
+
+
+def measure(function, repeat):
+    """Медиана времени вызова function в миллисекундах."""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+class Command(BaseCommand):
+    help = ('Проверяет, что быстрое представление рецептов совпадает с '
+            'RecipeSerializer побайтно, и сравнивает время сериализации и '
+            'рендеринга одной страницы списка рецептов.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--limits', default='6,100',
+            help='Размеры страниц через запятую')
+        parser.add_argument('--repeat', type=int, default=50)
+        parser.add_argument(
+            '--parity-pages', type=int, default=20,
+            help='Сколько страниц каждого размера сверить с '
+                 'RecipeSerializer')
+        parser.add_argument(
+            '--output', default='serializer-benchmark-results.json',
+            help='Файл для сохранения результатов')
+
+    def get_request(self, user):
+        host = next(
+            (host for host in settings.ALLOWED_HOSTS
+             if host and host != '*' and not host.startswith('.')),
+            'testserver'
+        )
+        request = RequestFactory(SERVER_NAME=host).get('/api/recipes/')
+        request.user = user
+        return request
+
+    def get_pages(self, user, limit, count):
+        recipes = Recipe.objects.with_related().with_user_flags(user)
+        pages = []
+        for offset in range(0, limit * count, limit):
+            page = list(recipes[offset:offset + limit])
+            if not page:
+                break
+            pages.append(page)
+        return pages
+
+    def render(self, implementation, page, request):
+        serializer_class, renderer = IMPLEMENTATIONS[implementation]
+        return renderer.render(serializer_class(
+            page, many=True, context={'request': request}).data)
+
+    def check_parity(self, pages, request):
+        for page in pages:
+            expected = self.render('drf', page, request)
+            if self.render('fast', page, request) == expected:
+                continue
+            for recipe in page:
+                if (self.render('fast', [recipe], request)
+                        != self.render('drf', [recipe], request)):
+                    raise CommandError(
+                        f'Представление рецепта {recipe.pk} отличается от '
+                        f'RecipeSerializer')
+            raise CommandError('Представление страницы отличается от '
+                               'RecipeSerializer')
+
+    def benchmark(self, implementation, page, request, repeat):
+        serializer_class, renderer = IMPLEMENTATIONS[implementation]
+        context = {'request': request}
+        data = serializer_class(page, many=True, context=context).data
+        serialize_ms = measure(
+            lambda: serializer_class(page, many=True, context=context).data,
+            repeat)
+        render_ms = measure(lambda: renderer.render(data), repeat)
+        return {
+            'serialize_ms': round(serialize_ms, 3),
+            'render_ms': round(render_ms, 3),
+            'total_ms': round(serialize_ms + render_ms, 3),
+            'bytes': len(renderer.render(data)),
+        }
+
+    def handle(self, *args, **options):
+        fixtures = ApiBenchmark().get_fixtures()
+        users = {
+            'anonymous': AnonymousUser(),
+            'authenticated': CustomUser.objects.get(pk=fixtures['user']),
+        }
+        limits = [int(value) for value in options['limits'].split(',')]
+
+        results = {}
+        for user_name, user in users.items():
+            request = self.get_request(user)
+            for limit in limits:
+                pages = self.get_pages(
+                    user, limit, max(options['parity_pages'], 1))
+                self.check_parity(pages, request)
+                measured = {
+                    implementation: self.benchmark(
+                        implementation, pages[0], request, options['repeat'])
+                    for implementation in IMPLEMENTATIONS
+                }
+                measured['speedup'] = round(
+                    measured['drf']['total_ms']
+                    / max(measured['fast']['total_ms'], 1e-9), 1)
+                label = f'{user_name} limit={limit}'
+                results[label] = measured
+                self.stdout.write(
+                    f'{label:<26} страниц сверено {len(pages):>3}  '
+                    f'DRF {measured["drf"]["serialize_ms"]:>7.2f} + '
+                    f'{measured["drf"]["render_ms"]:>6.2f} ms  '
+                    f'быстрый {measured["fast"]["serialize_ms"]:>7.2f} + '
+                    f'{measured["fast"]["render_ms"]:>6.2f} ms  '
+                    f'x{measured["speedup"]}'
+                )
+
+        report = {
+            'commit': ApiBenchmark().get_commit(),
+            'created_at': datetime.now(timezone.utc).isoformat(),
+            'database': connection.vendor,
+            'repeat': options['repeat'],
+            'results': results,
+        }
+        Path(options['output']).write_text(
+            json.dumps(report, ensure_ascii=False, indent=2))
+        self.stdout.write(self.style.SUCCESS(
+            f'Результаты сохранены в {options["output"]}'))
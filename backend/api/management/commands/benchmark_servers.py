@@ -0,0 +1,247 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from http.client import HTTPConnection
+from pathlib import Path
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from .benchmark_api import Command as ApiBenchmark
+from .benchmark_api import percentile
+
+SERVERS = {
+    'wsgi': (['foodgram_backend.wsgi:application'], {}),
+    'asgi': (
+        ['--worker-class', 'uvicorn.workers.UvicornWorker',
+         'foodgram_backend.asgi:application'],
+        {'ASYNC_API': 'true'}
+    ),
+}
+SCENARIOS = (
+    'recipes list anonymous', 'recipes list', 'recipe detail',
+    'subscriptions', 'shopping list txt', 'tags list', 'ingredients prefix',
+)
+STARTUP_TIMEOUT = 30
+
+
+def process_tree(pid):
+    """Процесс и все его потомки (Linux)."""
+    children = {}
+    for entry in Path('/proc').iterdir():
+        if not entry.name.isdigit():
+            continue
+        try:
+            stat = (entry / 'stat').read_text()
+        except OSError:
+            continue
+        parent = int(stat.rsplit(')', 1)[1].split()[1])
+        children.setdefault(parent, []).append(int(entry.name))
+    tree, pending = [], [pid]
+    while pending:
+        current = pending.pop()
+        tree.append(current)
+        pending.extend(children.get(current, ()))
+    return tree
+
+
+def memory_usage(pid, fields=('Rss',)):
+    """Память процесса в байтах по /proc/<pid>/smaps_rollup.
+
+    Pss делит общие страницы между процессами, которые их используют, и
+    в отличие от Rss показывает выигрыш от общей памяти после fork.
+    """
+    usage = dict.fromkeys(fields, 0)
+    try:
+        lines = Path(f'/proc/{pid}/smaps_rollup').read_text().splitlines()
+    except OSError:
+        return usage
+    for line in lines:
+        name, _, value = line.partition(':')
+        if name in usage:
+            usage[name] = int(value.split()[0]) * 1024
+    return usage
+
+
+def process_tree_rss(pid):
+    """Суммарный RSS процесса и всех его потомков в байтах."""
+    return sum(memory_usage(current)['Rss'] for current in process_tree(pid))
+
+
+class Client(threading.Thread):
+    """Клиент с keep-alive соединением, запросы идут друг за другом."""
+    def __init__(self, port, requests, deadline):
+        super().__init__(daemon=True)
+        self.port = port
+        self.requests = requests
+        self.deadline = deadline
+        self.latencies = []
+        self.errors = 0
+
+    def run(self):
+        http = HTTPConnection('127.0.0.1', self.port, timeout=60)
+        index = 0
+        while time.perf_counter() < self.deadline:
+            path, headers = self.requests[index % len(self.requests)]
+            index += 1
+            started = time.perf_counter()
+            try:
+                http.request('GET', path, headers=headers)
+                response = http.getresponse()
+                response.read()
+            except OSError:
+                self.errors += 1
+                http.close()
+                continue
+            self.latencies.append((time.perf_counter() - started) * 1000)
+            if response.status >= 400:
+                self.errors += 1
+        http.close()
+
+
+class Command(BaseCommand):
+    help = ('Запускает API под gunicorn с синхронными воркерами (WSGI) и с '
+            'воркерами uvicorn (ASGI) при одинаковом числе процессов и '
+            'сравнивает пропускную способность, задержки и занятую память '
+            'при разном числе одновременных клиентов.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2)
+        parser.add_argument(
+            '--concurrency', default='1,8,32,128',
+            help='Числа одновременных клиентов через запятую')
+        parser.add_argument(
+            '--duration', type=float, default=10,
+            help='Длительность замера на каждом уровне в секундах')
+        parser.add_argument('--warmup', type=float, default=2)
+        parser.add_argument('--port', type=int, default=8100)
+        parser.add_argument(
+            '--servers', default=','.join(SERVERS),
+            help='Сравниваемые варианты через запятую: wsgi, asgi')
+        parser.add_argument(
+            '--output', default='server-benchmark-results.json',
+            help='Файл для сохранения результатов')
+
+    def get_requests(self):
+        api_benchmark = ApiBenchmark()
+        fixtures = api_benchmark.get_fixtures()
+        headers = {'Authorization': f'Token {fixtures["token"]}'}
+        return [
+            (quote(path, safe='/?=&'), headers if auth else {})
+            for name, _, path, auth in api_benchmark.get_scenarios(fixtures)
+            if name in SCENARIOS
+        ]
+
+    def start_server(self, server, workers, port):
+        arguments, environment = SERVERS[server]
+        process = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn',
+             '--workers', str(workers),
+             '--bind', f'127.0.0.1:{port}',
+             '--chdir', str(settings.BASE_DIR),
+             '--log-level', 'warning',
+             *arguments],
+            env={**os.environ, **environment},
+        )
+        deadline = time.monotonic() + STARTUP_TIMEOUT
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise CommandError(f'Сервер {server} завершился при запуске')
+            try:
+                http = HTTPConnection('127.0.0.1', port, timeout=1)
+                http.request('GET', '/api/tags/')
+                http.getresponse().read()
+                http.close()
+                return process
+            except OSError:
+                time.sleep(0.2)
+        process.terminate()
+        raise CommandError(
+            f'Сервер {server} не ответил за {STARTUP_TIMEOUT} с')
+
+    def run_level(self, process, port, requests, concurrency, duration):
+        deadline = time.perf_counter() + duration
+        clients = [
+            Client(port, requests[index % len(requests):]
+                   + requests[:index % len(requests)], deadline)
+            for index in range(concurrency)
+        ]
+        started = time.perf_counter()
+        for client in clients:
+            client.start()
+        rss = 0
+        while any(client.is_alive() for client in clients):
+            rss = max(rss, process_tree_rss(process.pid))
+            time.sleep(0.5)
+        elapsed = time.perf_counter() - started
+        latencies = [
+            latency for client in clients for latency in client.latencies]
+        if not latencies:
+            raise CommandError('Сервер не обработал ни одного запроса')
+        return {
+            'requests': len(latencies),
+            'errors': sum(client.errors for client in clients),
+            'rps': round(len(latencies) / elapsed, 1),
+            'p50_ms': round(percentile(latencies, 0.50), 3),
+            'p95_ms': round(percentile(latencies, 0.95), 3),
+            'p99_ms': round(percentile(latencies, 0.99), 3),
+            'mean_ms': round(statistics.fmean(latencies), 3),
+            'rss_mb': round(rss / 2 ** 20, 1),
+        }
+
+    def handle(self, *args, **options):
+        requests = self.get_requests()
+        levels = [int(value) for value in options['concurrency'].split(',')]
+        servers = options['servers'].split(',')
+        unknown = set(servers) - set(SERVERS)
+        if unknown:
+            raise CommandError(f'Неизвестные варианты: {", ".join(unknown)}')
+
+        results = {}
+        for server in servers:
+            process = self.start_server(
+                server, options['workers'], options['port'])
+            try:
+                self.run_level(
+                    process, options['port'], requests,
+                    max(levels), options['warmup'])
+                results[server] = {}
+                for concurrency in levels:
+                    result = self.run_level(
+                        process, options['port'], requests,
+                        concurrency, options['duration'])
+                    results[server][concurrency] = result
+                    self.stdout.write(
+                        f'{server:<5} clients {concurrency:>4}  '
+                        f'{result["rps"]:>8.1f} req/s  '
+                        f'p50 {result["p50_ms"]:>8.2f} ms  '
+                        f'p95 {result["p95_ms"]:>8.2f} ms  '
+                        f'p99 {result["p99_ms"]:>8.2f} ms  '
+                        f'RSS {result["rss_mb"]:>7.1f} MB  '
+                        f'{result["rps"] / result["rss_mb"] * 100:>7.1f} '
+                        f'req/s на 100 MB  ошибок {result["errors"]}'
+                    )
+            finally:
+                process.terminate()
+                process.wait()
+
+        report = {
+            'commit': ApiBenchmark().get_commit(),
+            'created_at': datetime.now(timezone.utc).isoformat(),
+            'database': connection.vendor,
+            'workers': options['workers'],
+            'duration': options['duration'],
+            'scenarios': [path for path, _ in requests],
+            'results': results,
+        }
+        Path(options['output']).write_text(
+            json.dumps(report, ensure_ascii=False, indent=2))
+        self.stdout.write(self.style.SUCCESS(
+            f'Результаты сохранены в {options["output"]}'))
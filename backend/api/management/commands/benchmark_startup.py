@@ -0,0 +1,143 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from http.client import HTTPConnection
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from .benchmark_api import Command as ApiBenchmark
+from .benchmark_servers import Command as ServerBenchmark
+from .benchmark_servers import memory_usage, process_tree
+
+PROFILES = {
+    # Как в прежнем Dockerfile: синхронные воркеры без preload.
+    'default': ['foodgram_backend.wsgi:application'],
+    'production': ['--config', str(settings.BASE_DIR / 'gunicorn.conf.py')],
+}
+STARTUP_TIMEOUT = 60
+
+
+class Command(BaseCommand):
+    help = ('Запускает gunicorn с настройками по умолчанию и с '
+            'gunicorn.conf.py и сравнивает время до первого обслуженного '
+            'запроса, задержку первых запросов воркеров и память на воркер.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=2,
+            help='Число воркеров, одинаковое для всех профилей')
+        parser.add_argument('--port', type=int, default=8200)
+        parser.add_argument(
+            '--profiles', default=','.join(PROFILES),
+            help='Сравниваемые профили через запятую')
+        parser.add_argument(
+            '--output', default='startup-benchmark-results.json',
+            help='Файл для сохранения результатов')
+
+    def request(self, port, path, headers):
+        http = HTTPConnection('127.0.0.1', port, timeout=30)
+        started = time.perf_counter()
+        try:
+            http.request('GET', path, headers=headers)
+            http.getresponse().read()
+        finally:
+            http.close()
+        return (time.perf_counter() - started) * 1000
+
+    def wait_listening(self, process, port):
+        deadline = time.monotonic() + STARTUP_TIMEOUT
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise CommandError('gunicorn завершился при запуске')
+            try:
+                HTTPConnection('127.0.0.1', port, timeout=1).connect()
+                return
+            except OSError:
+                time.sleep(0.01)
+        raise CommandError(f'gunicorn не запустился за {STARTUP_TIMEOUT} с')
+
+    def measure(self, profile, workers, port, requests):
+        started = time.perf_counter()
+        process = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', *PROFILES[profile],
+             '--workers', str(workers),
+             '--bind', f'127.0.0.1:{port}',
+             '--chdir', str(settings.BASE_DIR),
+             '--log-level', 'warning',
+             '--access-logfile', os.devnull],
+            # Без явного --config gunicorn ищет gunicorn.conf.py в текущем
+            # каталоге, поэтому процесс запускается вне BASE_DIR.
+            cwd=tempfile.gettempdir(),
+            env=os.environ.copy(),
+        )
+        try:
+            self.wait_listening(process, port)
+            listening = time.perf_counter() - started
+            path, headers = requests[0]
+            first_request = self.request(port, path, headers)
+            first_response = time.perf_counter() - started
+            # Новое соединение на каждый запрос распределяет их по
+            # воркерам, первые проходы попадают в еще холодные воркеры.
+            passes = [
+                [self.request(port, path, headers)
+                 for path, headers in requests]
+                for _ in range(workers + 1)
+            ]
+            pids = process_tree(process.pid)
+            worker_memory = [
+                memory_usage(pid, ('Rss', 'Pss')) for pid in pids[1:]]
+            master_memory = memory_usage(process.pid, ('Rss', 'Pss'))
+        finally:
+            process.terminate()
+            process.wait()
+        return {
+            'listening_s': round(listening, 3),
+            'first_response_s': round(first_response, 3),
+            'first_request_ms': round(first_request, 3),
+            'cold_mean_ms': round(statistics.fmean(passes[0]), 3),
+            'warm_mean_ms': round(statistics.fmean(passes[-1]), 3),
+            'master_rss_mb': round(master_memory['Rss'] / 2 ** 20, 1),
+            'worker_rss_mb': [
+                round(memory['Rss'] / 2 ** 20, 1)
+                for memory in worker_memory],
+            'worker_pss_mb': [
+                round(memory['Pss'] / 2 ** 20, 1)
+                for memory in worker_memory],
+        }
+
+    def handle(self, *args, **options):
+        profiles = options['profiles'].split(',')
+        unknown = set(profiles) - set(PROFILES)
+        if unknown:
+            raise CommandError(f'Неизвестные профили: {", ".join(unknown)}')
+        requests = ServerBenchmark().get_requests()
+        results = {}
+        for profile in profiles:
+            result = results[profile] = self.measure(
+                profile, options['workers'], options['port'], requests)
+            self.stdout.write(
+                f'{profile:<10} порт открыт {result["listening_s"]:>6.2f} с  '
+                f'первый ответ {result["first_response_s"]:>6.2f} с '
+                f'({result["first_request_ms"]:.1f} ms)  '
+                f'холодные {result["cold_mean_ms"]:>7.2f} ms  '
+                f'прогретые {result["warm_mean_ms"]:>7.2f} ms  '
+                f'RSS воркеров {result["worker_rss_mb"]} MB  '
+                f'PSS воркеров {result["worker_pss_mb"]} MB'
+            )
+        report = {
+            'commit': ApiBenchmark().get_commit(),
+            'created_at': datetime.now(timezone.utc).isoformat(),
+            'workers': options['workers'],
+            'results': results,
+        }
+        Path(options['output']).write_text(
+            json.dumps(report, ensure_ascii=False, indent=2))
+        self.stdout.write(self.style.SUCCESS(
+            f'Результаты сохранены в {options["output"]}'))
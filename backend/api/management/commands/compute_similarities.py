@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from ...similarity import TOP_K, refresh
+
+
+class Command(BaseCommand):
+    help = ('Рассчитывает похожие рецепты по избранному и спискам покупок '
+            '(косинусная близость, top-K на рецепт).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-k', type=int, default=TOP_K)
+        parser.add_argument(
+            '--changed', action='store_true',
+            help='Пересчитать только рецепты с изменившимися '
+                 'взаимодействиями и их соседей')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        with transaction.atomic():
+            updated = refresh(options['changed'], options['top_k'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересчитано рецептов: {updated} '
+            f'за {time.perf_counter() - started:.1f} с'
+        ))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from ...images import generate_renditions, needs_renditions
+from ...models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Создает недостающие уменьшенные копии изображений рецептов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Пересоздать копии для всех рецептов'
+        )
+
+    def handle(self, *args, **options):
+        generated = failed = 0
+        recipes = Recipe.objects.only('id', 'image', 'image_renditions')
+        for recipe in recipes.iterator():
+            if not recipe.image or not (
+                    options['force'] or needs_renditions(recipe)):
+                continue
+            try:
+                generate_renditions(recipe)
+            except (OSError, ValueError) as error:
+                failed += 1
+                self.stderr.write(f'Рецепт {recipe.pk}: {error}')
+                continue
+            generated += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано копий для {generated} рецептов, ошибок: {failed}'))
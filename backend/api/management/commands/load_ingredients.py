@@ -0,0 +1,91 @@
+import csv
+import json
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from ...models import Ingredient
+
+DEFAULT_PATH = settings.BASE_DIR.parent / 'data' / 'ingredients.csv'
+
+
+def read_csv(file):
+    for row in csv.reader(file):
+        if len(row) >= 2:
+            yield row[0], row[1]
+
+
+def read_json(file):
+    for item in json.load(file):
+        yield item['name'], item['measurement_unit']
+
+
+READERS = {
+    'csv': read_csv,
+    'json': read_json,
+}
+
+
+class Command(BaseCommand):
+    help = 'Загружает каталог ингредиентов из CSV или JSON файла.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?', default=str(DEFAULT_PATH),
+            help='Путь к файлу ingredients.csv или ingredients.json'
+        )
+        parser.add_argument(
+            '--format', choices=READERS.keys(),
+            help='Формат файла, по умолчанию определяется по расширению'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Количество строк в одном INSERT'
+        )
+
+    def iter_unique(self, rows):
+        seen = set()
+        for name, measurement_unit in rows:
+            key = (name.strip(), measurement_unit.strip())
+            if key[0] and key not in seen:
+                seen.add(key)
+                yield key
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        file_format = options['format'] or path.suffix.lstrip('.').lower()
+        if file_format not in READERS:
+            raise CommandError(f'Неизвестный формат файла: {path}')
+        batch_size = options['batch_size']
+
+        started = time.perf_counter()
+        total = 0
+        count_before = Ingredient.objects.count()
+        try:
+            with open(path, encoding='utf-8') as file, transaction.atomic():
+                batch = []
+                for name, measurement_unit in self.iter_unique(
+                        READERS[file_format](file)):
+                    batch.append(Ingredient(
+                        name=name, measurement_unit=measurement_unit))
+                    if len(batch) >= batch_size:
+                        Ingredient.objects.bulk_create(
+                            batch, ignore_conflicts=True)
+                        total += len(batch)
+                        batch = []
+                if batch:
+                    Ingredient.objects.bulk_create(
+                        batch, ignore_conflicts=True)
+                    total += len(batch)
+        except OSError as error:
+            raise CommandError(f'Не удалось прочитать файл: {error}')
+        elapsed = time.perf_counter() - started
+        created = Ingredient.objects.count() - count_before
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано {total} ингредиентов, добавлено {created} '
+            f'за {elapsed:.3f} с ({total / max(elapsed, 1e-9):.0f} строк/с)'
+        ))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from ...carts import rebuild
+from ...models import CartIngredientTotal
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает итоги списков покупок с нуля, например после '
+            'переименования ингредиентов или правки таблицы единиц.')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'Строк в итогах: {CartIngredientTotal.objects.count()}'))
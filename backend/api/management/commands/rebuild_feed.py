@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from ...models import TimelineEntry
+from ...timeline import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Заново собирает ленты подписок всех пользователей.'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'Записей в лентах: {TimelineEntry.objects.count()}'))
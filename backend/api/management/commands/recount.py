@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from ...counters import COUNTERS, recount
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает денормализованные счетчики рецептов и авторов.'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            for source, field, target, counter in COUNTERS:
+                updated = recount(target, counter, source, field)
+                self.stdout.write(
+                    f'{target._meta.model_name}.{counter}: {updated}')
+        self.stdout.write(self.style.SUCCESS('Счетчики пересчитаны'))
@@ -0,0 +1,196 @@
+import random
+import time
+from io import BytesIO
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from PIL import Image
+
+from ...caching import bump_recipes_generation
+from ...carts import rebuild as rebuild_cart_totals
+from ...counters import recount_all
+from ...images import generate_renditions
+from ...models import (CustomUser, Favorite, Ingredient, IngredientRecipe,
+                       Recipe, RecipeTag, ShoppigCart, Subscription, Tag)
+from ...timeline import rebuild as rebuild_timelines
+
+USERNAME_PREFIX = 'bench_'
+PASSWORD = 'benchmark-password'
+TAGS = (
+    ('Завтрак', '#E26C2D', 'breakfast'),
+    ('Обед', '#49B64E', 'lunch'),
+    ('Ужин', '#8775D2', 'dinner'),
+)
+WORDS = (
+    'суп', 'салат', 'пирог', 'каша', 'запеканка', 'рагу', 'омлет', 'паста',
+    'котлеты', 'блины', 'плов', 'борщ', 'гуляш', 'сырники', 'шарлотка',
+    'овощной', 'куриный', 'грибной', 'домашний', 'быстрый', 'летний',
+    'острый', 'сливочный', 'томатный', 'сырный', 'мясной', 'рыбный',
+)
+
+
+def zipf_weights(size, exponent):
+    return [1 / (rank ** exponent) for rank in range(1, size + 1)]
+
+
+def sample_unique(rng, population, weights, count):
+    """Выбирает до count различных элементов со степенным распределением."""
+    count = min(count, len(population) // 2 or len(population))
+    chosen = set()
+    while len(chosen) < count:
+        chosen.update(rng.choices(population, weights, k=count - len(chosen)))
+    return chosen
+
+
+class Command(BaseCommand):
+    help = ('Детерминированно заполняет базу пользователями, рецептами, '
+            'избранным, списками покупок и подписками для нагрузочных '
+            'тестов.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument(
+            '--favorites', type=float, default=20,
+            help='Среднее число рецептов в избранном у пользователя')
+        parser.add_argument(
+            '--carts', type=float, default=5,
+            help='Среднее число рецептов в списке покупок у пользователя')
+        parser.add_argument(
+            '--subscriptions', type=float, default=10,
+            help='Среднее число подписок у пользователя')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument(
+            '--clear', action='store_true',
+            help='Удалить ранее созданные тестовые данные')
+
+    def activity(self, rng, mean):
+        """Активность пользователя по закону Парето со средним mean."""
+        alpha = 2.0
+        return min(
+            int(rng.paretovariate(alpha) * mean * (alpha - 1) / alpha),
+            int(mean * 20)
+        )
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        started = time.perf_counter()
+        benchmark_users = CustomUser.objects.filter(
+            username__startswith=USERNAME_PREFIX)
+        if benchmark_users.exists():
+            if not options['clear']:
+                raise CommandError(
+                    'Тестовые данные уже есть, используйте --clear')
+            benchmark_users.delete()
+
+        if not Ingredient.objects.exists():
+            call_command('load_ingredients', stdout=self.stdout)
+        ingredient_ids = list(
+            Ingredient.objects.order_by('pk').values_list('pk', flat=True))
+        for name, color, slug in TAGS:
+            Tag.objects.get_or_create(
+                slug=slug, defaults={'name': name, 'color': color})
+        tag_ids = list(Tag.objects.order_by('pk').values_list('pk', flat=True))
+
+        with transaction.atomic():
+            users = self.create_users(options['users'])
+            recipes = self.create_recipes(
+                rng, users, options['recipes'], tag_ids, ingredient_ids)
+            self.create_relations(rng, users, recipes, options)
+            recount_all()
+            Recipe.objects.filter(pk__in=recipes).refresh_tags_mask()
+            rebuild_timelines()
+            rebuild_cart_totals()
+        bump_recipes_generation()
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано {len(users)} пользователей и {len(recipes)} рецептов '
+            f'за {time.perf_counter() - started:.1f} с'
+        ))
+
+    def create_users(self, count):
+        password = make_password(PASSWORD)
+        CustomUser.objects.bulk_create((
+            CustomUser(
+                username=f'{USERNAME_PREFIX}{index}',
+                email=f'{USERNAME_PREFIX}{index}@example.com',
+                first_name='Тест',
+                last_name=f'Пользователь {index}',
+                password=password,
+            )
+            for index in range(count)
+        ), batch_size=self.batch_size)
+        return list(CustomUser.objects.filter(
+            username__startswith=USERNAME_PREFIX).order_by('pk').values_list(
+            'pk', flat=True))
+
+    def create_image(self):
+        buffer = BytesIO()
+        Image.new('RGB', (1600, 1200), '#E26C2D').save(buffer, 'JPEG')
+        name = default_storage.save(
+            'api/images/benchmark.jpg', ContentFile(buffer.getvalue()))
+        recipe = Recipe(image=name)
+        return name, generate_renditions(recipe)
+
+    def create_recipes(self, rng, users, count, tag_ids, ingredient_ids):
+        image, renditions = self.create_image()
+        author_weights = zipf_weights(len(users), 1.1)
+        ingredient_weights = zipf_weights(len(ingredient_ids), 0.9)
+        authors = rng.choices(users, author_weights, k=count)
+        Recipe.objects.bulk_create((
+            Recipe(
+                author_id=author,
+                name=' '.join(rng.sample(WORDS, 3)).capitalize(),
+                text=' '.join(rng.choices(WORDS, k=rng.randint(20, 120))),
+                image=image,
+                image_renditions=renditions,
+                cooking_time=rng.randint(5, 180),
+            )
+            for author in authors
+        ), batch_size=self.batch_size)
+        recipes = list(Recipe.objects.filter(
+            author_id__in=users).order_by('pk').values_list('pk', flat=True))
+
+        RecipeTag.objects.bulk_create((
+            RecipeTag(recipe_id=recipe, tag_id=tag)
+            for recipe in recipes
+            for tag in rng.sample(tag_ids, rng.randint(1, len(tag_ids)))
+        ), batch_size=self.batch_size)
+        IngredientRecipe.objects.bulk_create((
+            IngredientRecipe(
+                recipe_id=recipe,
+                ingredient_id=ingredient,
+                amount=rng.randint(1, 500)
+            )
+            for recipe in recipes
+            for ingredient in sample_unique(
+                rng, ingredient_ids, ingredient_weights, rng.randint(3, 15))
+        ), batch_size=self.batch_size)
+        return recipes
+
+    def create_relations(self, rng, users, recipes, options):
+        recipe_weights = zipf_weights(len(recipes), 1.0)
+        rng.shuffle(recipe_weights)
+        author_weights = zipf_weights(len(users), 1.1)
+        for model, mean in ((Favorite, options['favorites']),
+                            (ShoppigCart, options['carts'])):
+            model.objects.bulk_create((
+                model(user_id=user, recipe_id=recipe)
+                for user in users
+                for recipe in sample_unique(
+                    rng, recipes, recipe_weights,
+                    self.activity(rng, mean))
+            ), batch_size=self.batch_size)
+        Subscription.objects.bulk_create((
+            Subscription(subscriber_id=user, subscrib_to_id=author)
+            for user in users
+            for author in sample_unique(
+                rng, users, author_weights,
+                self.activity(rng, options['subscriptions']))
+            if author != user
+        ), batch_size=self.batch_size)
@@ -0,0 +1,163 @@
+import atexit
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from pathlib import Path
+
+from django.conf import settings
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+FLUSH_INTERVAL = 1.0
+# Сумма снимков завершившихся процессов.
+EXITED = 'exited'
+PREFIX = 'foodgram'
+
+
+def empty_series():
+    return {
+        'count': 0,
+        'duration': 0.0,
+        'buckets': [0] * (len(BUCKETS) + 1),
+        'queries': 0,
+        'query_time': 0.0,
+        'bytes': 0,
+    }
+
+
+def merge(total, snapshot):
+    for key, series in snapshot.items():
+        target = total.setdefault(key, empty_series())
+        for name in ('count', 'duration', 'queries', 'query_time', 'bytes'):
+            target[name] += series[name]
+        for index, value in enumerate(series['buckets']):
+            target['buckets'][index] += value
+    return total
+
+
+def read_snapshot(path):
+    try:
+        return json.loads(path.read_text())
+    except (OSError, ValueError):
+        return {}
+
+
+def write_snapshot(path, payload):
+    temporary = path.with_suffix(f'.{threading.get_ident()}.tmp')
+    temporary.write_text(payload)
+    os.replace(temporary, path)
+
+
+class MetricsRegistry:
+    """Метрики запросов текущего процесса.
+
+    Каждый процесс периодически сохраняет свой снимок в отдельный файл
+    каталога METRICS_DIR, а экспорт суммирует снимки всех процессов,
+    поэтому значения не теряются между воркерами gunicorn. Снимки
+    завершившихся воркеров мастер-процесс переносит в общий файл, чтобы
+    файлы не копились при перезапусках и не перезаписывались воркером
+    с тем же PID.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._series = {}
+        self._last_flush = 0.0
+
+    @property
+    def directory(self):
+        return Path(settings.METRICS_DIR)
+
+    def observe(self, labels, duration, queries, query_time, size):
+        key = '|'.join(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = empty_series()
+            series['count'] += 1
+            series['duration'] += duration
+            series['buckets'][bisect_left(BUCKETS, duration)] += 1
+            series['queries'] += queries
+            series['query_time'] += query_time
+            series['bytes'] += size
+        if time.monotonic() - self._last_flush > FLUSH_INTERVAL:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            self._last_flush = time.monotonic()
+            payload = json.dumps(self._series)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        write_snapshot(self.directory / f'{os.getpid()}.json', payload)
+
+    def mark_processes_dead(self, pids=None):
+        """Переносит снимки завершившихся процессов в общий файл и удаляет
+        их. Без pids переносит снимки всех процессов, например оставшиеся
+        от прошлого запуска. Вызывается только из мастер-процесса."""
+        if pids is None:
+            paths = [path for path in self.directory.glob('*.json')
+                     if path.stem.isdigit()]
+        else:
+            paths = [self.directory / f'{pid}.json' for pid in pids]
+        paths = [path for path in paths if path.exists()]
+        if not paths:
+            return
+        exited = self.directory / f'{EXITED}.json'
+        total = read_snapshot(exited)
+        for path in paths:
+            merge(total, read_snapshot(path))
+        write_snapshot(exited, json.dumps(total))
+        for path in paths:
+            path.unlink(missing_ok=True)
+
+    def collect(self):
+        """Суммирует снимки всех процессов."""
+        self.flush()
+        total = {}
+        for path in self.directory.glob('*.json'):
+            merge(total, read_snapshot(path))
+        return total
+
+    def render(self):
+        """Возвращает метрики в текстовом формате Prometheus."""
+        lines = []
+        metrics = sorted(self.collect().items())
+
+        def labels(key, le=None):
+            view, action, method = key.split('|')
+            pairs = [('view', view), ('action', action), ('method', method)]
+            if le is not None:
+                pairs.append(('le', le))
+            return '{' + ','.join(
+                f'{name}="{value}"' for name, value in pairs) + '}'
+
+        def counter(name, help_text, field):
+            lines.append(f'# HELP {PREFIX}_{name} {help_text}')
+            lines.append(f'# TYPE {PREFIX}_{name} counter')
+            for key, series in metrics:
+                lines.append(f'{PREFIX}_{name}{labels(key)} {series[field]}')
+
+        counter('http_requests_total', 'Number of requests.', 'count')
+        name = f'{PREFIX}_http_request_duration_seconds'
+        lines.append(f'# HELP {name} Request latency.')
+        lines.append(f'# TYPE {name} histogram')
+        for key, series in metrics:
+            cumulative = 0
+            for bound, value in zip(BUCKETS, series['buckets']):
+                cumulative += value
+                lines.append(
+                    f'{name}_bucket{labels(key, bound)} {cumulative}')
+            lines.append(
+                f'{name}_bucket{labels(key, "+Inf")} {series["count"]}')
+            lines.append(f'{name}_sum{labels(key)} {series["duration"]}')
+            lines.append(f'{name}_count{labels(key)} {series["count"]}')
+        counter('db_queries_total', 'Number of SQL queries.', 'queries')
+        counter('db_query_duration_seconds_total',
+                'Time spent in SQL queries.', 'query_time')
+        counter('http_response_bytes_total',
+                'Size of serialized responses.', 'bytes')
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+atexit.register(registry.flush)
@@ -0,0 +1,140 @@
+import time
+from contextlib import ExitStack
+
+from asgiref.sync import (iscoroutinefunction, markcoroutinefunction,
+                          sync_to_async)
+from django.db import connections
+
+from .metrics import registry
+
+
+class QueryCollector:
+    """Считает количество и время SQL-запросов одного HTTP-запроса."""
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.duration += time.perf_counter() - started
+
+
+def get_view_labels(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unresolved', '', request.method
+    view = getattr(match.func, 'cls', None)
+    actions = getattr(match.func, 'actions', None) or {}
+    if view is None:
+        return match.view_name or match._func_path, '', request.method
+    return (
+        view.__name__,
+        actions.get(request.method.lower(), ''),
+        request.method
+    )
+
+
+class MetricsMiddleware:
+    """Собирает метрики по представлениям и добавляет заголовок
+    Server-Timing с длительностью запроса и временем работы БД.
+
+    Работает и в синхронной, и в асинхронной цепочке middleware, чтобы
+    под ASGI не добавлять переход между потоками на каждый запрос.
+    Потоковые ответы, например список покупок, выполняют запросы к БД
+    во время отдачи: их метрики записываются по завершении потока, а
+    заголовок Server-Timing отражает только время до начала отдачи.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    @staticmethod
+    def collect(collector, databases=None):
+        stack = ExitStack()
+        for connection in databases or connections.all():
+            stack.enter_context(connection.execute_wrapper(collector))
+        return stack
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        collector = QueryCollector()
+        started = time.perf_counter()
+        with self.collect(collector):
+            response = self.get_response(request)
+        return self.finish(
+            request, response, collector, started, connections.all())
+
+    async def __acall__(self, request):
+        collector = QueryCollector()
+        started = time.perf_counter()
+        # Соединения с БД привязаны к потоку, а асинхронный ORM выполняет
+        # запросы в потоке sync_to_async, общем для всего HTTP-запроса.
+        databases = await sync_to_async(connections.all)()
+        with self.collect(collector, databases):
+            response = await self.get_response(request)
+        return self.finish(request, response, collector, started, databases)
+
+    @staticmethod
+    def observe(labels, collector, started, size):
+        registry.observe(
+            labels, time.perf_counter() - started,
+            collector.count, collector.duration, size
+        )
+
+    def stream(self, content, labels, collector, started, databases):
+        size = 0
+        iterator = iter(content)
+        try:
+            while True:
+                # Запросы считаются только пока готовится очередная часть.
+                with self.collect(collector, databases):
+                    chunk = next(iterator, None)
+                if chunk is None:
+                    return
+                size += len(chunk)
+                yield chunk
+        finally:
+            self.observe(labels, collector, started, size)
+
+    async def astream(self, content, labels, collector, started, databases):
+        size = 0
+        iterator = aiter(content)
+        try:
+            while True:
+                with self.collect(collector, databases):
+                    try:
+                        chunk = await anext(iterator)
+                    except StopAsyncIteration:
+                        return
+                size += len(chunk)
+                yield chunk
+        finally:
+            self.observe(labels, collector, started, size)
+
+    def finish(self, request, response, collector, started, databases):
+        labels = get_view_labels(request)
+        response['Server-Timing'] = (
+            f'db;dur={collector.duration * 1000:.1f};'
+            f'desc="{collector.count} queries", '
+            f'total;dur={(time.perf_counter() - started) * 1000:.1f}'
+        )
+        if not response.streaming:
+            self.observe(labels, collector, started, len(response.content))
+        elif response.is_async:
+            response.streaming_content = self.astream(
+                response.streaming_content, labels, collector, started,
+                databases)
+        else:
+            response.streaming_content = self.stream(
+                response.streaming_content, labels, collector, started,
+                databases)
+        return response
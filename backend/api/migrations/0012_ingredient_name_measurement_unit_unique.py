@@ -0,0 +1,54 @@
+from django.db import migrations, models
+from django.db.models import Count, F, Min
+
+
+def merge_duplicate_ingredients(apps, schema_editor):
+    Ingredient = apps.get_model('api', 'Ingredient')
+    IngredientRecipe = apps.get_model('api', 'IngredientRecipe')
+    duplicates = Ingredient.objects.values(
+        'name', 'measurement_unit'
+    ).annotate(
+        keep_id=Min('id'), total=Count('id')
+    ).filter(total__gt=1)
+    for duplicate in duplicates:
+        extra_ids = Ingredient.objects.filter(
+            name=duplicate['name'],
+            measurement_unit=duplicate['measurement_unit']
+        ).exclude(id=duplicate['keep_id']).values_list('id', flat=True)
+        for extra_id in list(extra_ids):
+            recipes_with_kept = IngredientRecipe.objects.filter(
+                ingredient_id=duplicate['keep_id']).values('recipe_id')
+            merged = IngredientRecipe.objects.filter(
+                ingredient_id=extra_id,
+                recipe_id__in=recipes_with_kept
+            )
+            # Рецепт уже содержит оставляемый ингредиент: количество
+            # дубликата прибавляется к нему, а не теряется.
+            for recipe_id, amount in merged.values_list(
+                    'recipe_id', 'amount'):
+                IngredientRecipe.objects.filter(
+                    ingredient_id=duplicate['keep_id'], recipe_id=recipe_id
+                ).update(amount=F('amount') + amount)
+            merged.delete()
+            IngredientRecipe.objects.filter(ingredient_id=extra_id).update(
+                ingredient_id=duplicate['keep_id'])
+            Ingredient.objects.filter(id=extra_id).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_alter_subscription_unique_together'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            merge_duplicate_ingredients, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(
+                fields=('name', 'measurement_unit'),
+                name='ingredient_name_measurement_unit_unique'
+            ),
+        ),
+    ]
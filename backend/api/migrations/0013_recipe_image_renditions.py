@@ -0,0 +1,21 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_ingredient_name_measurement_unit_unique'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='image_renditions',
+            field=models.JSONField(
+                blank=True,
+                default=dict,
+                editable=False,
+                verbose_name='Уменьшенные копии фото'
+            ),
+        ),
+    ]
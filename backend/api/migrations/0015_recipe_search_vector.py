@@ -0,0 +1,68 @@
+import django.contrib.postgres.search
+from django.db import migrations
+
+FORWARD_SQL = (
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    '''
+    CREATE OR REPLACE FUNCTION api_recipe_search_vector_update()
+    RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector :=
+            setweight(to_tsvector('russian', coalesce(NEW.name, '')), 'A')
+            || setweight(to_tsvector('russian', coalesce(NEW.text, '')), 'B');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    ''',
+    '''
+    CREATE TRIGGER api_recipe_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF name, text ON api_recipe
+    FOR EACH ROW EXECUTE FUNCTION api_recipe_search_vector_update()
+    ''',
+    '''
+    UPDATE api_recipe SET search_vector =
+        setweight(to_tsvector('russian', coalesce(name, '')), 'A')
+        || setweight(to_tsvector('russian', coalesce(text, '')), 'B')
+    ''',
+    'CREATE INDEX recipe_search_idx ON api_recipe USING gin (search_vector)',
+    'CREATE INDEX recipe_name_trgm_idx ON api_recipe '
+    'USING gin (name gin_trgm_ops)',
+)
+
+BACKWARD_SQL = (
+    'DROP INDEX IF EXISTS recipe_name_trgm_idx',
+    'DROP INDEX IF EXISTS recipe_search_idx',
+    'DROP TRIGGER IF EXISTS api_recipe_search_vector_trigger ON api_recipe',
+    'DROP FUNCTION IF EXISTS api_recipe_search_vector_update()',
+)
+
+
+# GIN-индексы создаются только в PostgreSQL и не описываются в Meta
+# модели: иначе SQLite не сможет пересоздавать таблицу api_recipe.
+def run_on_postgresql(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0014_recipe_created_at_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False, null=True, verbose_name='Поисковый вектор'),
+        ),
+        migrations.RunPython(
+            run_on_postgresql(FORWARD_SQL),
+            run_on_postgresql(BACKWARD_SQL)
+        ),
+    ]
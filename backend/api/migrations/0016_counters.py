@@ -0,0 +1,59 @@
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+COUNTERS = (
+    ('Favorite', 'recipe', 'Recipe', 'favorites_count'),
+    ('ShoppigCart', 'recipe', 'Recipe', 'in_carts_count'),
+    ('Recipe', 'author', 'CustomUser', 'recipes_count'),
+    ('Subscription', 'subscrib_to', 'CustomUser', 'followers_count'),
+)
+
+
+def fill_counters(apps, schema_editor):
+    for source_name, field, target_name, counter in COUNTERS:
+        source = apps.get_model('api', source_name)
+        target = apps.get_model('api', target_name)
+        target.objects.update(**{counter: Coalesce(Subquery(
+            source.objects.filter(**{field: OuterRef('pk')}).order_by(
+            ).values(field).annotate(total=Count('pk')).values('total')
+        ), Value(0))})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0015_recipe_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='followers_count',
+            field=models.PositiveIntegerField(
+                default=0, editable=False,
+                verbose_name='Количество подписчиков'),
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='recipes_count',
+            field=models.PositiveIntegerField(
+                default=0, editable=False,
+                verbose_name='Количество рецептов'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(
+                default=0, editable=False,
+                verbose_name='Добавлено в избранное'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='in_carts_count',
+            field=models.PositiveIntegerField(
+                default=0, editable=False,
+                verbose_name='Добавлено в списки покупок'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,90 @@
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+BACKFILL_SIZE = 100
+BATCH_SIZE = 1000
+
+
+def fill_timelines(apps, schema_editor):
+    Recipe = apps.get_model('api', 'Recipe')
+    Subscription = apps.get_model('api', 'Subscription')
+    TimelineEntry = apps.get_model('api', 'TimelineEntry')
+    recent = {}
+    entries = []
+    subscriptions = Subscription.objects.filter(
+        subscrib_to__followers_count__lt=settings.FEED_FANOUT_FOLLOWERS
+    ).values_list('subscriber_id', 'subscrib_to_id')
+    for subscriber_id, author_id in subscriptions.iterator():
+        if author_id not in recent:
+            recent[author_id] = list(Recipe.objects.filter(
+                author_id=author_id
+            ).order_by('-created_at', '-id').values_list(
+                'id', 'created_at')[:BACKFILL_SIZE])
+        entries.extend(
+            TimelineEntry(
+                user_id=subscriber_id,
+                author_id=author_id,
+                recipe_id=recipe_id,
+                created_at=created_at
+            )
+            for recipe_id, created_at in recent[author_id]
+        )
+        if len(entries) >= BATCH_SIZE:
+            TimelineEntry.objects.bulk_create(entries, ignore_conflicts=True)
+            entries = []
+    TimelineEntry.objects.bulk_create(entries, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0016_counters'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(
+                fields=['author', '-created_at', '-id'],
+                name='recipe_author_created_at_idx'
+            ),
+        ),
+        migrations.CreateModel(
+            name='TimelineEntry',
+            fields=[
+                ('id', models.BigAutoField(
+                    auto_created=True, primary_key=True, serialize=False,
+                    verbose_name='ID')),
+                ('created_at', models.DateTimeField(
+                    verbose_name='Дата публикации')),
+                ('author', models.ForeignKey(
+                    on_delete=django.db.models.deletion.CASCADE,
+                    related_name='+', to=settings.AUTH_USER_MODEL,
+                    verbose_name='Автор')),
+                ('recipe', models.ForeignKey(
+                    on_delete=django.db.models.deletion.CASCADE,
+                    related_name='+', to='api.recipe',
+                    verbose_name='Рецепт')),
+                ('user', models.ForeignKey(
+                    on_delete=django.db.models.deletion.CASCADE,
+                    related_name='timeline', to=settings.AUTH_USER_MODEL,
+                    verbose_name='Подписчик')),
+            ],
+            options={
+                'verbose_name': 'запись ленты',
+                'verbose_name_plural': 'Лента подписок',
+                'indexes': [models.Index(
+                    fields=['user', '-created_at', '-recipe'],
+                    name='timeline_user_created_at_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='timelineentry',
+            constraint=models.UniqueConstraint(
+                fields=('user', 'recipe'),
+                name='timelineentry_user_recipe_unique'
+            ),
+        ),
+        migrations.RunPython(fill_timelines, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,51 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0017_timelineentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='similarity_signature',
+            field=models.BigIntegerField(
+                editable=False, null=True,
+                verbose_name='Отпечаток избранного и списков покупок'),
+        ),
+        migrations.CreateModel(
+            name='RecipeSimilarity',
+            fields=[
+                ('id', models.BigAutoField(
+                    auto_created=True, primary_key=True, serialize=False,
+                    verbose_name='ID')),
+                ('score', models.FloatField(
+                    verbose_name='Косинусная близость')),
+                ('recipe', models.ForeignKey(
+                    on_delete=django.db.models.deletion.CASCADE,
+                    related_name='+', to='api.recipe',
+                    verbose_name='Рецепт')),
+                ('similar', models.ForeignKey(
+                    on_delete=django.db.models.deletion.CASCADE,
+                    related_name='similar_for', to='api.recipe',
+                    verbose_name='Похожий рецепт')),
+            ],
+            options={
+                'verbose_name': 'похожий рецепт',
+                'verbose_name_plural': 'Похожие рецепты',
+                'indexes': [models.Index(
+                    fields=['recipe', '-score'],
+                    name='recipesimilarity_recipe_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='recipesimilarity',
+            constraint=models.UniqueConstraint(
+                fields=('recipe', 'similar'),
+                name='recipesimilarity_recipe_similar_unique'
+            ),
+        ),
+    ]
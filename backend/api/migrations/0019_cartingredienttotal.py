@@ -0,0 +1,93 @@
+from collections import defaultdict
+from decimal import Decimal
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+# Копия таблицы из api/units.py на момент миграции.
+UNITS = {
+    'мг': ('г', Decimal('0.001')),
+    'г': ('г', Decimal(1)),
+    'кг': ('г', Decimal(1000)),
+    'мл': ('мл', Decimal(1)),
+    'л': ('мл', Decimal(1000)),
+    'ч. л.': ('мл', Decimal(5)),
+    'ст. л.': ('мл', Decimal(15)),
+    'стакан': ('мл', Decimal(250)),
+}
+
+
+def normalize(measurement_unit, amount):
+    unit, factor = UNITS.get(
+        measurement_unit.strip().lower(), (measurement_unit, Decimal(1)))
+    return unit, Decimal(amount) * factor
+
+
+def fill_cart_totals(apps, schema_editor):
+    IngredientRecipe = apps.get_model('api', 'IngredientRecipe')
+    CartIngredientTotal = apps.get_model('api', 'CartIngredientTotal')
+    amounts = defaultdict(Decimal)
+    recipes = defaultdict(set)
+    for user_id, recipe_id, name, measurement_unit, amount in (
+            IngredientRecipe.objects.filter(
+                recipe__shoppigcart__isnull=False
+            ).values_list(
+                'recipe__shoppigcart__user_id', 'recipe_id',
+                'ingredient__name', 'ingredient__measurement_unit', 'amount'
+            ).iterator()):
+        unit, amount = normalize(measurement_unit, amount)
+        amounts[user_id, name, unit] += amount
+        recipes[user_id, name, unit].add(recipe_id)
+    CartIngredientTotal.objects.bulk_create(
+        (
+            CartIngredientTotal(
+                user_id=user_id, name=name, measurement_unit=unit,
+                amount=amount, recipes=len(recipes[user_id, name, unit]))
+            for (user_id, name, unit), amount in amounts.items()
+        ),
+        batch_size=5000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0018_recipesimilarity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CartIngredientTotal',
+            fields=[
+                ('id', models.BigAutoField(
+                    auto_created=True, primary_key=True, serialize=False,
+                    verbose_name='ID')),
+                ('name', models.CharField(
+                    max_length=200, verbose_name='Название')),
+                ('measurement_unit', models.CharField(
+                    max_length=200, verbose_name='Единицы измерения')),
+                ('amount', models.DecimalField(
+                    decimal_places=3, max_digits=16,
+                    verbose_name='Количество')),
+                ('recipes', models.PositiveIntegerField(
+                    default=0, verbose_name='Число рецептов с ингредиентом')),
+                ('user', models.ForeignKey(
+                    on_delete=django.db.models.deletion.CASCADE,
+                    related_name='cart_totals', to=settings.AUTH_USER_MODEL,
+                    verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'итог списка покупок',
+                'verbose_name_plural': 'Итоги списков покупок',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='cartingredienttotal',
+            constraint=models.UniqueConstraint(
+                fields=('user', 'name', 'measurement_unit'),
+                name='cartingredienttotal_user_name_unit_unique'
+            ),
+        ),
+        migrations.RunPython(fill_cart_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,53 @@
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Cast, Coalesce
+
+TAG_BITS = 63
+
+
+def fill_tags_mask(apps, schema_editor):
+    Tag = apps.get_model('api', 'Tag')
+    Recipe = apps.get_model('api', 'Recipe')
+    RecipeTag = apps.get_model('api', 'RecipeTag')
+    tags = list(Tag.objects.order_by('pk'))
+    if len(tags) > TAG_BITS:
+        raise RuntimeError(f'Маска вмещает не больше {TAG_BITS} тегов')
+    for bit, tag in enumerate(tags):
+        tag.bit = bit
+    Tag.objects.bulk_update(tags, ['bit'])
+    bit = Cast(Value(1), models.BigIntegerField()).bitleftshift(
+        F('tag__bit'))
+    masks = RecipeTag.objects.filter(recipe=OuterRef('pk')).order_by(
+    ).values('recipe').annotate(mask=Sum(bit)).values('mask')
+    Recipe.objects.update(tags_mask=Coalesce(
+        Subquery(masks), Value(0), output_field=models.BigIntegerField()))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0019_cartingredienttotal'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tag',
+            name='bit',
+            field=models.PositiveSmallIntegerField(
+                null=True, editable=False, verbose_name='Бит в маске тегов'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='tags_mask',
+            field=models.BigIntegerField(
+                default=0, editable=False, verbose_name='Маска тегов'),
+        ),
+        migrations.RunPython(fill_tags_mask, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='tag',
+            name='bit',
+            field=models.PositiveSmallIntegerField(
+                unique=True, editable=False,
+                verbose_name='Бит в маске тегов'),
+        ),
+    ]
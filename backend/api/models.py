@@ -1,5 +1,13 @@
 from django.contrib.auth.models import AbstractUser
+from django.contrib.postgres.search import SearchVectorField
+from django.core.exceptions import ValidationError
 from django.db import models
+from django.db.models import (Exists, F, OuterRef, Prefetch, Subquery, Sum,
+                              Value, Window)
+from django.db.models.functions import Cast, Coalesce, RowNumber
+
+# Биты 0..62: маска тегов рецепта остается положительной в BIGINT.
+TAG_BITS = 63
 
 
 class CustomUser(AbstractUser):
@@ -10,6 +18,10 @@ class CustomUser(AbstractUser):
     first_name = models.CharField(max_length=150, verbose_name='Имя')
     last_name = models.CharField(max_length=150, verbose_name='Фамилия')
     password = models.CharField(max_length=150, verbose_name='Пароль')
+    recipes_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name='Количество рецептов')
+    followers_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name='Количество подписчиков')
 
     class Meta:
         verbose_name = 'пользователь'
@@ -23,6 +35,8 @@ class Tag(models.Model):
     color = models.CharField(max_length=7, unique=True, verbose_name='Цвет')
     slug = models.SlugField(
         max_length=200, db_index=True, unique=True, verbose_name='Слаг')
+    bit = models.PositiveSmallIntegerField(
+        unique=True, editable=False, verbose_name='Бит в маске тегов')
 
     class Meta:
         verbose_name = 'тег'
@@ -31,6 +45,23 @@ class Tag(models.Model):
     def __str__(self):
         return self.name
 
+    @classmethod
+    def get_free_bit(cls):
+        used = set(cls.objects.values_list('bit', flat=True))
+        for bit in range(TAG_BITS):
+            if bit not in used:
+                return bit
+        raise ValidationError(f'Нельзя создать больше {TAG_BITS} тегов')
+
+    def clean(self):
+        if self.bit is None:
+            self.get_free_bit()
+
+    def save(self, *args, **kwargs):
+        if self.bit is None:
+            self.bit = self.get_free_bit()
+        super().save(*args, **kwargs)
+
 
 class Ingredient(models.Model):
     name = models.CharField(max_length=200, verbose_name='Название')
@@ -41,17 +72,95 @@ class Ingredient(models.Model):
         ordering = ['name']
         verbose_name = 'ингредиент'
         verbose_name_plural = 'Ингредиенты'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('name', 'measurement_unit'),
+                name='ingredient_name_measurement_unit_unique'
+            ),
+        )
 
     def __str__(self):
         return self.name
 
 
+class RecipeQuerySet(models.QuerySet):
+
+    def with_related(self):
+        """Подгружает автора, теги и ингредиенты рецептов."""
+        return self.select_related('author').prefetch_related(
+            Prefetch(
+                'recipetag_set',
+                queryset=RecipeTag.objects.select_related('tag')
+            ),
+            Prefetch(
+                'ingredientrecipe_set',
+                queryset=IngredientRecipe.objects.select_related('ingredient')
+            ),
+        )
+
+    def with_user_flags(self, user):
+        """Аннотирует рецепты признаками избранного, списка покупок и
+        подписки на автора для указанного пользователя."""
+        if not user.is_authenticated:
+            return self.annotate(
+                is_favorited=Value(False),
+                is_in_shopping_cart=Value(False),
+                author_is_subscribed=Value(False),
+            )
+        return self.annotate(
+            is_favorited=Exists(Favorite.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+            is_in_shopping_cart=Exists(ShoppigCart.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+            author_is_subscribed=Exists(Subscription.objects.filter(
+                subscriber=user, subscrib_to=OuterRef('author'))),
+        )
+
+    def top_by_author(self, author_ids, limit=None):
+        """Возвращает не более limit последних рецептов каждого автора
+        одним запросом с оконной функцией."""
+        queryset = self.filter(author_id__in=author_ids)
+        if limit is None:
+            return queryset
+        return queryset.annotate(row_number=Window(
+            RowNumber(),
+            partition_by=F('author_id'),
+            order_by=(F('created_at').desc(), F('id').desc())
+        )).filter(row_number__lte=limit)
+
+    def with_tags(self, mask, match_all=False):
+        """Рецепты с любым или со всеми тегами из маски."""
+        queryset = self.alias(tag_bits=F('tags_mask').bitand(mask))
+        if match_all:
+            return queryset.filter(tag_bits=mask)
+        return queryset.filter(tag_bits__gt=0)
+
+    def refresh_tags_mask(self):
+        """Пересчитывает маски тегов рецептов одним UPDATE.
+
+        Нужен после RecipeTag.objects.bulk_create, который не отправляет
+        post_save.
+        """
+        bit = Cast(Value(1), models.BigIntegerField()).bitleftshift(
+            F('tag__bit'))
+        masks = RecipeTag.objects.filter(recipe=OuterRef('pk')).order_by(
+        ).values('recipe').annotate(mask=Sum(bit)).values('mask')
+        return self.update(tags_mask=Coalesce(
+            Subquery(masks), Value(0), output_field=models.BigIntegerField()))
+
+
 class Recipe(models.Model):
     author = models.ForeignKey(
         CustomUser, on_delete=models.CASCADE, verbose_name='Автор')
     name = models.CharField(max_length=200, verbose_name='Название')
     image = models.ImageField(
         upload_to='api/images/', verbose_name='Фото готового блюда')
+    image_renditions = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        verbose_name='Уменьшенные копии фото'
+    )
     text = models.TextField(verbose_name='Описание процесса приготовления')
     ingredients = models.ManyToManyField(
         Ingredient, through='IngredientRecipe')
@@ -63,11 +172,42 @@ class Recipe(models.Model):
         auto_now_add=True, verbose_name='Дата создания')
     modified_at = models.DateTimeField(
         auto_now_add=False, auto_now=True, verbose_name='Дата изменения')
+    favorites_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name='Добавлено в избранное')
+    in_carts_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name='Добавлено в списки покупок')
+    search_vector = SearchVectorField(
+        null=True, editable=False, verbose_name='Поисковый вектор')
+    similarity_signature = models.BigIntegerField(
+        null=True,
+        editable=False,
+        verbose_name='Отпечаток избранного и списков покупок'
+    )
+    tags_mask = models.BigIntegerField(
+        default=0, editable=False, verbose_name='Маска тегов')
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
         ordering = ['-created_at']
         verbose_name = 'рецепт'
         verbose_name_plural = 'Рецепты'
+        # GIN-индексы для полнотекстового и триграммного поиска
+        # создаются только в PostgreSQL миграцией 0015.
+        indexes = (
+            models.Index(
+                fields=('-created_at', '-id'),
+                name='recipe_created_at_id_idx'
+            ),
+            models.Index(
+                fields=('author', '-created_at', '-id'),
+                name='recipe_author_created_at_idx'
+            ),
+            models.Index(
+                fields=('modified_at',),
+                name='recipe_modified_at_idx'
+            ),
+        )
 
     def __str__(self):
         return self.name
@@ -181,3 +321,107 @@ class Subscription(models.Model):
                 name='subscription_subscriber_subscrib_to_unique'
             ),
         )
+
+
+class TimelineEntry(models.Model):
+    """Рецепт в ленте подписчика, записывается при публикации."""
+    user = models.ForeignKey(
+        CustomUser,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Подписчик'
+    )
+    author = models.ForeignKey(
+        CustomUser,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор'
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Рецепт'
+    )
+    created_at = models.DateTimeField(verbose_name='Дата публикации')
+
+    class Meta:
+        verbose_name = 'запись ленты'
+        verbose_name_plural = 'Лента подписок'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'recipe'),
+                name='timelineentry_user_recipe_unique'
+            ),
+        )
+        indexes = (
+            models.Index(
+                fields=('user', '-created_at', '-recipe'),
+                name='timeline_user_created_at_idx'
+            ),
+        )
+
+
+class RecipeSimilarity(models.Model):
+    """Похожий рецепт, рассчитывается командой compute_similarities."""
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Рецепт'
+    )
+    similar = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='similar_for',
+        verbose_name='Похожий рецепт'
+    )
+    score = models.FloatField(verbose_name='Косинусная близость')
+
+    class Meta:
+        verbose_name = 'похожий рецепт'
+        verbose_name_plural = 'Похожие рецепты'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('recipe', 'similar'),
+                name='recipesimilarity_recipe_similar_unique'
+            ),
+        )
+        indexes = (
+            models.Index(
+                fields=('recipe', '-score'),
+                name='recipesimilarity_recipe_idx'
+            ),
+        )
+
+
+class CartIngredientTotal(models.Model):
+    """Итог по ингредиенту в списке покупок пользователя.
+
+    Обновляется при добавлении и удалении рецептов из списка покупок и
+    при изменении ингредиентов рецептов, которые в нем лежат. Количество
+    хранится в базовой единице измерения (см. api/units.py).
+    """
+    user = models.ForeignKey(
+        CustomUser,
+        on_delete=models.CASCADE,
+        related_name='cart_totals',
+        verbose_name='Пользователь'
+    )
+    name = models.CharField(max_length=200, verbose_name='Название')
+    measurement_unit = models.CharField(
+        max_length=200, verbose_name='Единицы измерения')
+    amount = models.DecimalField(
+        max_digits=16, decimal_places=3, verbose_name='Количество')
+    recipes = models.PositiveIntegerField(
+        default=0, verbose_name='Число рецептов с ингредиентом')
+
+    class Meta:
+        verbose_name = 'итог списка покупок'
+        verbose_name_plural = 'Итоги списков покупок'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'name', 'measurement_unit'),
+                name='cartingredienttotal_user_name_unit_unique'
+            ),
+        )
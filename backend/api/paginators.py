@@ -1,6 +1,206 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.paginator import InvalidPage
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
 
 class CustomNumberPaginator(PageNumberPagination):
+    """Постраничная пагинация с опциональным режимом курсора.
+
+    Если в запросе есть параметр cursor (в том числе пустой), страница
+    выбирается по ключу сортировки queryset (например, created_at и id),
+    а не через OFFSET и COUNT(*), поэтому любая страница стоит столько же,
+    сколько первая.
+    """
     page_size = 6
     page_size_query_param = 'limit'
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Неверный курсор'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.use_cursor = self.cursor_query_param in request.query_params
+        if not self.use_cursor:
+            return super().paginate_queryset(queryset, request, view)
+        return self.get_cursor_page(
+            list(self.get_cursor_queryset(queryset, request)))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """paginate_queryset для асинхронных представлений: COUNT(*) и
+        выборка страницы выполняются асинхронным ORM."""
+        self.use_cursor = self.cursor_query_param in request.query_params
+        if self.use_cursor:
+            return self.get_cursor_page([
+                obj async for obj in self.get_cursor_queryset(
+                    queryset, request)
+            ])
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+        paginator = self.django_paginator_class(queryset, page_size)
+        paginator.count = await queryset.acount()
+        page_number = self.get_page_number(request, paginator)
+        try:
+            self.page = paginator.page(page_number)
+        except InvalidPage as exc:
+            raise NotFound(self.invalid_page_message.format(
+                page_number=page_number, message=str(exc)))
+        self.page.object_list = [obj async for obj in self.page.object_list]
+        if paginator.num_pages > 1 and self.template is not None:
+            self.display_page_controls = True
+        self.request = request
+        return list(self.page)
+
+    def get_cursor_queryset(self, queryset, request):
+        """Запрос страницы курсора с одной лишней записью, по которой
+        видно, есть ли следующая страница."""
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(queryset)
+        self.cursor_page_size = self.get_page_size(request)
+        self.position, self.reverse = self.decode_cursor(request, queryset)
+
+        ordering = self.ordering
+        if self.reverse:
+            ordering = [self.invert(field) for field in ordering]
+        queryset = queryset.order_by(*ordering)
+        if self.position is not None:
+            queryset = queryset.filter(self.get_keyset_filter(
+                ordering, self.position))
+        return queryset[:self.cursor_page_size + 1]
+
+    def get_cursor_page(self, results):
+        page_size, reverse = self.cursor_page_size, self.reverse
+        has_more = len(results) > page_size
+        results = results[:page_size]
+        if reverse:
+            results.reverse()
+
+        self.next_position = self.previous_position = None
+        if results and (reverse or has_more):
+            self.next_position = self.get_position(results[-1])
+        if results and (has_more if reverse else self.position is not None):
+            self.previous_position = self.get_position(results[0])
+        return results
+
+    def get_paginated_response(self, data):
+        if not self.use_cursor:
+            return super().get_paginated_response(data)
+        return Response({
+            'next': self.encode_cursor(self.next_position, False),
+            'previous': self.encode_cursor(self.previous_position, True),
+            'results': data,
+        })
+
+    def get_ordering(self, queryset):
+        ordering = list(
+            queryset.query.order_by or queryset.model._meta.ordering)
+        if not any(field.lstrip('-') in ('pk', 'id') for field in ordering):
+            descending = bool(ordering) and ordering[-1].startswith('-')
+            ordering.append('-pk' if descending else 'pk')
+        return ordering
+
+    @staticmethod
+    def invert(field):
+        return field[1:] if field.startswith('-') else f'-{field}'
+
+    def get_position(self, obj):
+        return [
+            getattr(obj, field.lstrip('-')) for field in self.ordering]
+
+    @staticmethod
+    def get_keyset_filter(ordering, position):
+        condition = Q()
+        for index, field in enumerate(ordering):
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            step = Q(**{f'{field.lstrip("-")}__{lookup}': position[index]})
+            for previous_field, value in zip(ordering[:index], position):
+                step &= Q(**{previous_field.lstrip('-'): value})
+            condition |= step
+        return condition
+
+    def encode_cursor(self, position, reverse):
+        if position is None:
+            return None
+        payload = json.dumps(
+            {'p': position, 'r': reverse}, default=str).encode()
+        return replace_query_param(
+            remove_query_param(self.base_url, self.page_query_param),
+            self.cursor_query_param,
+            urlsafe_b64encode(payload).decode()
+        )
+
+    @staticmethod
+    def to_python(queryset, field, value):
+        name = field.lstrip('-')
+        try:
+            model_field = queryset.model._meta.get_field(
+                'id' if name == 'pk' else name)
+        except FieldDoesNotExist:
+            return value
+        return model_field.to_python(value)
+
+    def decode_cursor(self, request, queryset):
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None, False
+        try:
+            payload = json.loads(urlsafe_b64decode(cursor.encode()))
+            position = [
+                self.to_python(queryset, field, value)
+                for field, value in zip(self.ordering, payload['p'])
+            ]
+            if len(position) != len(self.ordering):
+                raise ValueError
+            return position, bool(payload.get('r'))
+        except (TypeError, ValueError, KeyError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+
+class ListPaginator(CustomNumberPaginator):
+    """Постраничная пагинация готового списка, без режима курсора."""
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.use_cursor = False
+        return super(CustomNumberPaginator, self).paginate_queryset(
+            queryset, request, view)
+
+
+class FeedPaginator(CustomNumberPaginator):
+    """Курсорная пагинация ленты подписок по дате публикации и id."""
+
+    def paginate_queryset(self, feed, request, view=None):
+        self.base_url = request.build_absolute_uri()
+        page_size = self.get_page_size(request)
+        results = feed.page(page_size + 1, self.decode_position(request))
+        self.next_position = None
+        if len(results) > page_size:
+            results = results[:page_size]
+            self.next_position = [results[-1].created_at, results[-1].pk]
+        return results
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.encode_cursor(self.next_position, False),
+            'results': data,
+        })
+
+    def decode_position(self, request):
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None
+        try:
+            payload = json.loads(urlsafe_b64decode(cursor.encode()))
+            created_at, pk = payload['p']
+            created_at = parse_datetime(created_at)
+            if created_at is None:
+                raise ValueError
+            return created_at, int(pk)
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
@@ -0,0 +1,106 @@
+import csv
+import json
+
+import orjson
+from rest_framework import renderers
+
+
+class Echo:
+    """Псевдо-буфер для csv.writer, возвращающий записанную строку."""
+    def write(self, value):
+        return value
+
+
+class ORJSONRenderer(renderers.JSONRenderer):
+    """JSONRenderer на orjson с тем же компактным выводом.
+
+    Типы, которые orjson не поддерживает или выводит иначе (Decimal,
+    даты, ленивые строки), преобразуются кодировщиком DRF. Вывод с
+    отступами, например для BrowsableAPIRenderer, строит JSONRenderer.
+    """
+    options = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(
+                data, accepted_media_type, renderer_context)
+        # Как и JSONRenderer, экранирует разделители строк для JavaScript.
+        return orjson.dumps(
+            data, default=self.encoder_class().default, option=self.options
+        ).replace(b'\xe2\x80\xa8', b'\\u2028').replace(
+            b'\xe2\x80\xa9', b'\\u2029')
+
+
+class ShoppingListStreamMixin:
+    """Построчный вывод списка покупок из обычного или асинхронного
+    итератора строк (название, единицы измерения, количество)."""
+
+    def header(self):
+        return ''
+
+    def footer(self, empty):
+        return ''
+
+    def stream(self, ingredients):
+        yield self.header()
+        first = True
+        for row in ingredients:
+            yield self.format_row(row, first)
+            first = False
+        yield self.footer(first)
+
+    async def astream(self, ingredients):
+        yield self.header()
+        first = True
+        async for row in ingredients:
+            yield self.format_row(row, first)
+            first = False
+        yield self.footer(first)
+
+
+class ShoppingListTextRenderer(ShoppingListStreamMixin,
+                               renderers.BaseRenderer):
+    """Список покупок в виде текстового файла."""
+    media_type = 'text/plain'
+    format = 'txt'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, dict):
+            data = '\n'.join(str(value) for value in data.values())
+        return str(data).encode(self.charset)
+
+    def format_row(self, row, first):
+        name, measurement_unit, amount = row
+        return f'{name.capitalize()} ({measurement_unit}) - {amount}\n'
+
+
+class ShoppingListCSVRenderer(ShoppingListTextRenderer):
+    """Список покупок в формате CSV."""
+    media_type = 'text/csv'
+    format = 'csv'
+
+    def header(self):
+        return self.format_row(
+            ('Название', 'Единицы измерения', 'Количество'), True)
+
+    def format_row(self, row, first):
+        return csv.writer(Echo()).writerow(row)
+
+
+class ShoppingListJSONRenderer(ShoppingListStreamMixin,
+                               renderers.JSONRenderer):
+    """Список покупок в формате JSON."""
+
+    def format_row(self, row, first):
+        name, measurement_unit, amount = row
+        return ('[' if first else ',') + json.dumps({
+            'name': name,
+            'measurement_unit': measurement_unit,
+            'amount': amount
+        }, ensure_ascii=False)
+
+    def footer(self, empty):
+        return '[]' if empty else ']'
@@ -1,9 +1,11 @@
 from django.contrib.auth.hashers import check_password
 from django.core.validators import RegexValidator
+from django.db import transaction
 from rest_framework import serializers, status
 from rest_framework.validators import UniqueValidator
 
-from .fields import Base64ImageField, Hex2NameColor
+from .carts import track_recipe
+from .fields import Base64ImageField, Hex2NameColor, ImageRenditionField
 from .models import (CustomUser, Favorite, Ingredient, IngredientRecipe,
                      Recipe, RecipeTag, ShoppigCart, Subscription, Tag)
 
@@ -44,6 +46,8 @@ class RegisterSerializer(serializers.ModelSerializer):
 
 class IsSubscribedField(serializers.SerializerMethodField):
     def to_representation(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         user = self.context.get('user')
         if user and user.is_authenticated:
             return Subscription.objects.filter(
@@ -131,6 +135,10 @@ class RecipeSerializer(serializers.ModelSerializer):
     author = CustomUserSerializer(
         read_only=True, default=serializers.CurrentUserDefault())
     image = Base64ImageField(required=True)
+    image_thumb = ImageRenditionField('thumb')
+    image_thumb_webp = ImageRenditionField('thumb_webp')
+    image_detail = ImageRenditionField('detail')
+    image_detail_webp = ImageRenditionField('detail_webp')
     cooking_time = serializers.IntegerField(required=True)
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
@@ -159,18 +167,17 @@ class RecipeSerializer(serializers.ModelSerializer):
         for tag_id in tags_data:
             try:
                 int(tag_id)
-            except ValueError:
+            except (TypeError, ValueError):
                 raise serializers.ValidationError(
                     {"tags": "Тег должен иметь тип Int"},
                     code=status.HTTP_400_BAD_REQUEST
                 )
-            try:
-                Tag.objects.get(pk=tag_id)
-            except Tag.DoesNotExist:
-                raise serializers.ValidationError(
-                    "Тег с указанным ID не найден",
-                    code=status.HTTP_400_BAD_REQUEST
-                )
+        tag_ids = {int(tag_id) for tag_id in tags_data}
+        if len(Tag.objects.in_bulk(tag_ids)) != len(tag_ids):
+            raise serializers.ValidationError(
+                "Тег с указанным ID не найден",
+                code=status.HTTP_400_BAD_REQUEST
+            )
         return tags_data
 
     def validate_ingredients(self, ingredients_data):
@@ -188,13 +195,6 @@ class RecipeSerializer(serializers.ModelSerializer):
                     'Количество ингридиента должно быть больше 0',
                     code=status.HTTP_400_BAD_REQUEST
                 )
-            try:
-                Ingredient.objects.get(pk=ingredient_id)
-            except Ingredient.DoesNotExist:
-                raise serializers.ValidationError(
-                    'Ингредиент с указанным ID не найден',
-                    code=status.HTTP_400_BAD_REQUEST
-                )
             if not ingredient_id:
                 raise serializers.ValidationError(
                     'Не выбрано ни одного ингридиента',
@@ -206,6 +206,19 @@ class RecipeSerializer(serializers.ModelSerializer):
                     code=status.HTTP_400_BAD_REQUEST
                 )
             ingredient_ids.add(ingredient_id)
+        try:
+            ingredient_ids = {int(pk) for pk in ingredient_ids}
+        except (TypeError, ValueError):
+            raise serializers.ValidationError(
+                'Ингредиент с указанным ID не найден',
+                code=status.HTTP_400_BAD_REQUEST
+            )
+        if len(Ingredient.objects.in_bulk(ingredient_ids)) != len(
+                ingredient_ids):
+            raise serializers.ValidationError(
+                'Ингредиент с указанным ID не найден',
+                code=status.HTTP_400_BAD_REQUEST
+            )
         return ingredients_data
 
     def validate(self, data):
@@ -226,11 +239,20 @@ class RecipeSerializer(serializers.ModelSerializer):
         return False
 
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         return self.is_object_in_model(obj, Favorite)
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         return self.is_object_in_model(obj, ShoppigCart)
 
+    def to_representation(self, instance):
+        if hasattr(instance, 'author_is_subscribed'):
+            instance.author.is_subscribed = instance.author_is_subscribed
+        return super().to_representation(instance)
+
     class Meta:
         model = Recipe
         fields = (
@@ -242,60 +264,225 @@ class RecipeSerializer(serializers.ModelSerializer):
             'is_in_shopping_cart',
             'name',
             'image',
+            'image_thumb',
+            'image_thumb_webp',
+            'image_detail',
+            'image_detail_webp',
             'text',
             'cooking_time'
         )
 
     def create_or_update_tags_and_ingredients(
-            self, recipe, tags_data, ingredients_data):
-        recipe_tags_to_create = []
-        for tag_data in tags_data:
-            if tag_data:
-                recipe_tags_to_create.append(RecipeTag(
-                    tag_id=tag_data, recipe=recipe))
-        RecipeTag.objects.bulk_create(recipe_tags_to_create)
+            self, recipe, tags_data, ingredients_data, created=False):
+        """Приводит связи рецепта с тегами и ингредиентами к переданным,
+        изменяя только отличающиеся строки."""
+        current_tags = {} if created else {
+            recipe_tag.tag_id: recipe_tag
+            for recipe_tag in recipe.recipetag_set.all()
+        }
+        tag_ids = [int(tag_id) for tag_id in tags_data if tag_id]
+        RecipeTag.objects.filter(id__in=[
+            recipe_tag.id for tag_id, recipe_tag in current_tags.items()
+            if tag_id not in tag_ids
+        ]).delete()
+        added = RecipeTag.objects.bulk_create([
+            RecipeTag(tag_id=tag_id, recipe=recipe)
+            for tag_id in tag_ids if tag_id not in current_tags
+        ])
+        if added:
+            # Удаление отправляет post_delete, и маску пересчитывает
+            # сигнал, а bulk_create сигналов не отправляет.
+            Recipe.objects.filter(pk=recipe.pk).refresh_tags_mask()
+
+        current_ingredients = {} if created else {
+            ingredient_recipe.ingredient_id: ingredient_recipe
+            for ingredient_recipe in recipe.ingredientrecipe_set.all()
+        }
+        amounts = {
+            int(ingredient_data['id']): int(ingredient_data.get('amount', 0))
+            for ingredient_data in ingredients_data
+            if ingredient_data.get('id', None)
+        }
+        IngredientRecipe.objects.filter(id__in=[
+            ingredient_recipe.id
+            for ingredient_id, ingredient_recipe in current_ingredients.items()
+            if ingredient_id not in amounts
+        ]).delete()
         ingredients_recipe_to_create = []
-        for ingredient_data in ingredients_data:
-            ingredient_id = ingredient_data.get('id', None)
-            amount = ingredient_data.get('amount', 0)
-            if ingredient_id:
+        ingredients_recipe_to_update = []
+        for ingredient_id, amount in amounts.items():
+            ingredient_recipe = current_ingredients.get(ingredient_id)
+            if ingredient_recipe is None:
                 ingredients_recipe_to_create.append(IngredientRecipe(
                     recipe=recipe, ingredient_id=ingredient_id, amount=amount))
+            elif ingredient_recipe.amount != amount:
+                ingredient_recipe.amount = amount
+                ingredients_recipe_to_update.append(ingredient_recipe)
         IngredientRecipe.objects.bulk_create(ingredients_recipe_to_create)
+        IngredientRecipe.objects.bulk_update(
+            ingredients_recipe_to_update, ['amount'])
 
+    @transaction.atomic
     def create(self, validated_data):
         tags_data = validated_data.pop('tags')
         ingredients_data = validated_data.pop('ingredients')
         recipe = Recipe.objects.create(**validated_data)
         self.create_or_update_tags_and_ingredients(
-            recipe, tags_data, ingredients_data)
+            recipe, tags_data, ingredients_data, created=True)
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         tags_data = validated_data.pop('tags')
         ingredients_data = validated_data.pop('ingredients')
-        instance.tags.clear()
-        instance.ingredients.clear()
-        self.create_or_update_tags_and_ingredients(
-            instance, tags_data, ingredients_data)
-        instance = super().update(instance, validated_data)
+        with track_recipe(instance.pk):
+            self.create_or_update_tags_and_ingredients(
+                instance, tags_data, ingredients_data)
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        # Счётчики, маска тегов, копии фото и отпечаток обновляются
+        # отдельными UPDATE, и полное сохранение затёрло бы их значениями,
+        # прочитанными до правки.
+        instance.save(update_fields=[*validated_data, 'modified_at'])
         return instance
 
 
+class RecipeReadSerializer:
+    """Быстрое представление рецептов только для чтения.
+
+    Возвращает те же данные, что RecipeSerializer, для рецептов из
+    Recipe.objects.with_related().with_user_flags(user), но собирает
+    словари напрямую, без полей DRF. Теги и авторы, которые повторяются
+    на странице, преобразуются один раз.
+    """
+    renditions = ('thumb', 'thumb_webp', 'detail', 'detail_webp')
+
+    def __init__(self, instance=None, many=False, context=None, **kwargs):
+        self.instance = instance
+        self.many = many
+        self.context = context or {}
+        request = self.context.get('request', None)
+        self.build_url = (
+            request.build_absolute_uri if request is not None else str)
+        self.tags = {}
+        self.authors = {}
+
+    @property
+    def data(self):
+        if self.many:
+            return [self.to_representation(recipe) for recipe in self.instance]
+        return self.to_representation(self.instance)
+
+    def get_tag(self, tag):
+        data = self.tags.get(tag.pk)
+        if data is None:
+            data = self.tags[tag.pk] = {
+                'id': tag.id,
+                'name': tag.name,
+                'color': tag.color,
+                'slug': tag.slug,
+            }
+        return data
+
+    def get_author(self, recipe):
+        data = self.authors.get(recipe.author_id)
+        if data is None:
+            author = recipe.author
+            data = self.authors[recipe.author_id] = {
+                'email': author.email,
+                'id': author.id,
+                'username': author.username,
+                'first_name': author.first_name,
+                'last_name': author.last_name,
+                'is_subscribed': recipe.author_is_subscribed,
+            }
+        return data
+
+    def get_images(self, recipe):
+        image = recipe.image
+        if not image:
+            return (None,) * (len(self.renditions) + 1)
+        url = image.url
+        renditions = recipe.image_renditions
+        current = renditions.get('source') == image.name
+        return (self.build_url(url), *(
+            self.build_url(
+                image.storage.url(renditions[rendition])
+                if current and renditions.get(rendition) else url)
+            for rendition in self.renditions
+        ))
+
+    def to_representation(self, recipe):
+        (image, image_thumb, image_thumb_webp,
+         image_detail, image_detail_webp) = self.get_images(recipe)
+        return {
+            'id': recipe.id,
+            'tags': [
+                self.get_tag(recipe_tag.tag)
+                for recipe_tag in recipe.recipetag_set.all()
+            ],
+            'author': self.get_author(recipe),
+            'ingredients': [
+                {
+                    'id': ingredient_recipe.ingredient.id,
+                    'name': ingredient_recipe.ingredient.name,
+                    'measurement_unit': (
+                        ingredient_recipe.ingredient.measurement_unit),
+                    'amount': ingredient_recipe.amount,
+                }
+                for ingredient_recipe in recipe.ingredientrecipe_set.all()
+            ],
+            'is_favorited': recipe.is_favorited,
+            'is_in_shopping_cart': recipe.is_in_shopping_cart,
+            'name': recipe.name,
+            'image': image,
+            'image_thumb': image_thumb,
+            'image_thumb_webp': image_thumb_webp,
+            'image_detail': image_detail,
+            'image_detail_webp': image_detail_webp,
+            'text': recipe.text,
+            'cooking_time': recipe.cooking_time,
+        }
+
+
+class IdsSerializer(serializers.Serializer):
+    """Список id для массового добавления и удаления."""
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=100
+    )
+
+    def validate_ids(self, value):
+        return list(dict.fromkeys(value))
+
+
 class ShoppingCartFavoriteSerializer(serializers.ModelSerializer):
     """Сериализатор списка покупок и избранного."""
+    image_thumb = ImageRenditionField('thumb')
+    image_thumb_webp = ImageRenditionField('thumb_webp')
+
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = (
+            'id',
+            'name',
+            'image',
+            'image_thumb',
+            'image_thumb_webp',
+            'cooking_time'
+        )
 
 
 class SubscriptionSerializer(serializers.ModelSerializer):
     """Сериализатор подписок."""
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.SerializerMethodField()
     is_subscribed = IsSubscribedField()
 
     def get_recipes(self, obj):
+        if hasattr(obj, 'limited_recipes'):
+            return ShoppingCartFavoriteSerializer(
+                obj.limited_recipes, many=True).data
         recipes_limit = self.context.get('recipes_limit')
         recipes_queryset = obj.recipe_set.all()
         if recipes_limit is not None:
@@ -314,7 +501,3 @@ class SubscriptionSerializer(serializers.ModelSerializer):
             'recipes',
             'recipes_count'
         )
-
-    def get_recipes_count(self, instance):
-        recipes_count = instance.recipe_set.count()
-        return recipes_count
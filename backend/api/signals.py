@@ -0,0 +1,129 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .authentication import forget_tokens, forget_user_tokens
+from .caching import bump_recipes_generation
+from .carts import add_to_totals, remove_from_totals
+from .counters import COUNTERS, change_counter
+from .images import needs_renditions, schedule_renditions
+from .indexes import ingredient_index, recipe_ingredient_index, tag_cache
+from .models import (CustomUser, Ingredient, IngredientRecipe, Recipe,
+                     RecipeTag, ShoppigCart, Subscription, Tag)
+from .timeline import (backfill, crossed_fanout_threshold, prune,
+                       resume_fanout, schedule_fan_out)
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def invalidate_ingredient_index(sender, **kwargs):
+    ingredient_index.invalidate()
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def invalidate_tag_cache(sender, **kwargs):
+    tag_cache.invalidate()
+
+
+@receiver(post_delete, sender=Token)
+def forget_deleted_token(sender, instance, **kwargs):
+    forget_tokens([instance.key])
+
+
+@receiver(post_save, sender=CustomUser)
+def forget_changed_user_tokens(sender, instance, created, **kwargs):
+    if not created:
+        forget_user_tokens(instance.pk)
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+@receiver((post_save, post_delete), sender=IngredientRecipe)
+def refresh_recipe_ingredient_index(sender, instance, **kwargs):
+    recipe_id = instance.pk if sender is Recipe else instance.recipe_id
+    transaction.on_commit(
+        partial(recipe_ingredient_index.refresh, [recipe_id]))
+
+
+@receiver(post_save, sender=Recipe)
+def generate_recipe_image_renditions(sender, instance, **kwargs):
+    if needs_renditions(instance):
+        transaction.on_commit(partial(schedule_renditions, instance.pk))
+
+
+@receiver(post_save, sender=Recipe)
+def fan_out_recipe(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(partial(schedule_fan_out, instance.pk))
+
+
+@receiver(post_save, sender=Subscription)
+def backfill_timeline(sender, instance, created, **kwargs):
+    if created:
+        backfill(instance.subscriber_id, instance.subscrib_to)
+
+
+@receiver(post_delete, sender=Subscription)
+def prune_timeline(sender, instance, **kwargs):
+    prune(instance.subscriber_id, instance.subscrib_to_id)
+
+
+@receiver((post_save, post_delete), sender=RecipeTag)
+def refresh_recipe_tags_mask(sender, instance, **kwargs):
+    Recipe.objects.filter(pk=instance.recipe_id).refresh_tags_mask()
+
+
+@receiver(post_save, sender=ShoppigCart)
+def add_to_cart_totals(sender, instance, created, **kwargs):
+    if created:
+        add_to_totals(instance.user_id, [instance.recipe_id])
+
+
+@receiver(pre_delete, sender=ShoppigCart)
+def remove_from_cart_totals(sender, instance, **kwargs):
+    # pre_delete: ингредиенты рецепта еще не удалены, если рецепт
+    # удаляется вместе со списками покупок.
+    remove_from_totals(instance.user_id, [instance.recipe_id])
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+@receiver((post_save, post_delete), sender=RecipeTag)
+@receiver((post_save, post_delete), sender=IngredientRecipe)
+@receiver((post_save, post_delete), sender=Tag)
+@receiver((post_save, post_delete), sender=Ingredient)
+@receiver((post_save, post_delete), sender=CustomUser)
+def invalidate_recipes_cache(sender, update_fields=None, **kwargs):
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    transaction.on_commit(bump_recipes_generation)
+
+
+def connect_counter(source, field, target, counter):
+    def increment(sender, instance, created, **kwargs):
+        if created:
+            change_counter(
+                target, getattr(instance, f'{field}_id'), counter, 1)
+
+    def decrement(sender, instance, **kwargs):
+        change_counter(target, getattr(instance, f'{field}_id'), counter, -1)
+
+    post_save.connect(
+        increment, sender=source, weak=False,
+        dispatch_uid=f'increment_{counter}')
+    post_delete.connect(
+        decrement, sender=source, weak=False,
+        dispatch_uid=f'decrement_{counter}')
+
+
+for source, field, target, counter in COUNTERS:
+    connect_counter(source, field, target, counter)
+
+
+# Подключается после счетчиков, поэтому followers_count уже уменьшен, а
+# строка автора заблокирована до конца транзакции.
+@receiver(post_delete, sender=Subscription)
+def resume_timeline_fanout(sender, instance, **kwargs):
+    if crossed_fanout_threshold(instance.subscrib_to_id):
+        transaction.on_commit(
+            partial(resume_fanout, instance.subscrib_to_id))
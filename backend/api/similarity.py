@@ -0,0 +1,230 @@
+"""Расчет похожих рецептов по избранному и спискам покупок.
+
+Модуль использует NumPy и SciPy и импортируется только командой
+compute_similarities, веб-процессы читают готовую таблицу
+RecipeSimilarity.
+"""
+from io import StringIO
+from itertools import chain
+
+import numpy as np
+from django.db import connection
+from scipy import sparse
+
+from .models import Favorite, Recipe, RecipeSimilarity, ShoppigCart
+
+INTERACTIONS = (
+    (Favorite, 1.0),
+    (ShoppigCart, 0.5),
+)
+TOP_K = 20
+CHUNK_SIZE = 2000
+BATCH_SIZE = 5000
+FETCH_SIZE = 20000
+COPY_SIZE = 100000
+SIGNATURE_MULTIPLIER = 2654435761
+
+
+def load_interactions():
+    """Возвращает массивы id рецептов, id пользователей и весов."""
+    recipes, users, weights = [], [], []
+    for model, weight in INTERACTIONS:
+        pairs = np.fromiter(
+            chain.from_iterable(
+                model.objects.order_by().values_list(
+                    'recipe_id', 'user_id').iterator(chunk_size=FETCH_SIZE)
+            ),
+            dtype=np.int64
+        ).reshape(-1, 2)
+        recipes.append(pairs[:, 0])
+        users.append(pairs[:, 1])
+        weights.append(np.full(len(pairs), weight))
+    return (
+        np.concatenate(recipes),
+        np.concatenate(users),
+        np.concatenate(weights),
+    )
+
+
+class InteractionMatrix:
+    """Разреженная матрица рецепт × пользователь с нормированными строками.
+
+    Произведение строк такой матрицы дает косинусную близость рецептов.
+    """
+    def __init__(self, recipes, users, weights):
+        self.recipe_ids, rows = np.unique(recipes, return_inverse=True)
+        user_ids, columns = np.unique(users, return_inverse=True)
+        matrix = sparse.csr_matrix(
+            (weights, (rows, columns)),
+            shape=(len(self.recipe_ids), len(user_ids))
+        )
+        matrix.sum_duplicates()
+        self.signatures = self.get_signatures(matrix, user_ids)
+        norms = np.sqrt(matrix.multiply(matrix).sum(axis=1)).A1
+        self.matrix = sparse.diags(1 / norms) @ matrix
+        self.transposed = self.matrix.T.tocsr()
+
+    @staticmethod
+    def get_signatures(matrix, user_ids):
+        """Отпечаток каждой строки: меняется при любом изменении набора
+        пользователей или их весов у рецепта."""
+        hashed = (
+            user_ids[matrix.indices] * SIGNATURE_MULTIPLIER
+            + np.rint(matrix.data * 2).astype(np.int64)
+        )
+        return np.add.reduceat(hashed, matrix.indptr[:-1])
+
+    def positions(self, recipe_ids):
+        """Позиции строк рецептов, рецепты без взаимодействий пропускаются."""
+        return np.flatnonzero(np.isin(
+            self.recipe_ids, np.asarray(recipe_ids, dtype=np.int64)))
+
+    def neighbours(self, positions):
+        """Позиции всех рецептов, у которых есть общие пользователи с
+        рецептами в positions."""
+        if not len(positions):
+            return positions
+        products = self.matrix[positions] @ self.transposed
+        return np.unique(products.indices)
+
+    def top_similar(self, positions, top_k=TOP_K):
+        """Для каждой позиции возвращает (id рецепта, id похожих, оценки)."""
+        for start in range(0, len(positions), CHUNK_SIZE):
+            chunk = positions[start:start + CHUNK_SIZE]
+            products = (self.matrix[chunk] @ self.transposed).tocsr()
+            for row, position in enumerate(chunk):
+                begin, end = products.indptr[row], products.indptr[row + 1]
+                columns = products.indices[begin:end]
+                scores = products.data[begin:end]
+                mask = columns != position
+                columns, scores = columns[mask], scores[mask]
+                if len(scores) > top_k:
+                    best = np.argpartition(-scores, top_k)[:top_k]
+                    columns, scores = columns[best], scores[best]
+                order = np.argsort(-scores, kind='stable')
+                yield (
+                    int(self.recipe_ids[position]),
+                    self.recipe_ids[columns[order]].tolist(),
+                    scores[order].tolist(),
+                )
+
+
+def batched(values, size=BATCH_SIZE):
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def copy_similarities(rows):
+    """Записывает похожие рецепты в PostgreSQL через COPY пачками."""
+    columns = ', '.join(
+        RecipeSimilarity._meta.get_field(name).column
+        for name in ('recipe', 'similar', 'score')
+    )
+    sql = f'COPY {RecipeSimilarity._meta.db_table} ({columns}) FROM STDIN'
+    buffer, lines = StringIO(), 0
+    with connection.cursor() as cursor:
+        for recipe_id, similar_ids, scores in rows:
+            for similar_id, score in zip(similar_ids, scores):
+                buffer.write(f'{recipe_id}\t{similar_id}\t{score!r}\n')
+            lines += len(similar_ids)
+            if lines >= COPY_SIZE:
+                buffer.seek(0)
+                cursor.copy_expert(sql, buffer)
+                buffer, lines = StringIO(), 0
+        buffer.seek(0)
+        cursor.copy_expert(sql, buffer)
+
+
+def write_similarities(rows):
+    """Пачками записывает рассчитанные похожие рецепты."""
+    if connection.vendor == 'postgresql':
+        return copy_similarities(rows)
+    batch = []
+    for recipe_id, similar_ids, scores in rows:
+        batch.extend(
+            RecipeSimilarity(
+                recipe_id=recipe_id, similar_id=similar_id, score=score)
+            for similar_id, score in zip(similar_ids, scores)
+        )
+        if len(batch) >= BATCH_SIZE:
+            RecipeSimilarity.objects.bulk_create(batch)
+            batch = []
+    RecipeSimilarity.objects.bulk_create(batch)
+
+
+def save_signatures(recipe_ids, signatures):
+    """Сохраняет отпечатки, в PostgreSQL одним UPDATE из массивов."""
+    if connection.vendor == 'postgresql':
+        table = Recipe._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'UPDATE {table} SET similarity_signature = new.signature '
+                'FROM unnest(%s::bigint[], %s::bigint[]) '
+                'AS new (id, signature) '
+                f'WHERE {table}.id = new.id',
+                [list(recipe_ids), list(signatures)]
+            )
+        return
+    for batch in batched(list(zip(recipe_ids, signatures)), 1000):
+        Recipe.objects.bulk_update(
+            [
+                Recipe(pk=recipe_id, similarity_signature=signature)
+                for recipe_id, signature in batch
+            ],
+            ('similarity_signature',)
+        )
+
+
+def delete_similarities(recipe_ids):
+    for batch in batched(list(recipe_ids)):
+        RecipeSimilarity.objects.filter(recipe_id__in=batch).delete()
+
+
+def refresh(changed_only=False, top_k=TOP_K):
+    """Пересчитывает похожие рецепты и возвращает число обновленных.
+
+    В режиме changed_only пересчитываются только рецепты, у которых
+    изменился отпечаток взаимодействий, и рецепты, близость с которыми
+    могла от этого измениться: имеющие с ними общих пользователей или
+    уже ссылающиеся на них.
+    """
+    recipes, users, weights = load_interactions()
+    if not len(recipes):
+        RecipeSimilarity.objects.all().delete()
+        Recipe.objects.update(similarity_signature=None)
+        return 0
+    matrix = InteractionMatrix(recipes, users, weights)
+    recipe_ids = matrix.recipe_ids.tolist()
+    signatures = matrix.signatures.tolist()
+    if not changed_only:
+        RecipeSimilarity.objects.all().delete()
+        Recipe.objects.filter(similarity_signature__isnull=False).update(
+            similarity_signature=None)
+        save_signatures(recipe_ids, signatures)
+        targets = np.arange(len(recipe_ids))
+    else:
+        stored = dict(Recipe.objects.filter(
+            similarity_signature__isnull=False).values_list(
+            'id', 'similarity_signature').iterator(chunk_size=FETCH_SIZE))
+        current = dict(zip(recipe_ids, signatures))
+        changed = [
+            pk for pk, signature in current.items()
+            if stored.get(pk) != signature
+        ]
+        removed = [pk for pk in stored if pk not in current]
+        referencing = set()
+        for batch in batched(changed + removed):
+            referencing.update(RecipeSimilarity.objects.filter(
+                similar_id__in=batch).values_list('recipe_id', flat=True))
+        targets = np.union1d(
+            matrix.neighbours(matrix.positions(changed)),
+            matrix.positions(list(referencing))
+        )
+        delete_similarities(removed)
+        for batch in batched(removed):
+            Recipe.objects.filter(pk__in=batch).update(
+                similarity_signature=None)
+        save_signatures(changed, [current[pk] for pk in changed])
+        delete_similarities(matrix.recipe_ids[targets].tolist())
+    write_similarities(matrix.top_similar(targets, top_k))
+    return len(targets)
@@ -0,0 +1,62 @@
+from django.core.cache import cache
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+
+from ..models import (CustomUser, Ingredient, IngredientRecipe, Recipe,
+                      RecipeTag, Tag)
+
+
+class ApiTestCase(APITestCase):
+    """Общие данные тестов API: пользователи, теги, ингредиенты и
+    рецепты."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = cls.create_user('user')
+        cls.author = cls.create_user('author')
+        cls.breakfast = Tag.objects.create(
+            name='Завтрак', color='#E26C2D', slug='breakfast')
+        cls.lunch = Tag.objects.create(
+            name='Обед', color='#49B64E', slug='lunch')
+        cls.flour = Ingredient.objects.create(
+            name='мука', measurement_unit='г')
+        cls.milk = Ingredient.objects.create(
+            name='молоко', measurement_unit='мл')
+        cls.egg = Ingredient.objects.create(
+            name='яйцо', measurement_unit='шт')
+
+    def setUp(self):
+        # Поколение рецептов увеличивается после коммита, которого в
+        # TestCase нет, поэтому закешированные ответы сбрасываются явно.
+        cache.clear()
+
+    @staticmethod
+    def create_user(username):
+        return CustomUser.objects.create_user(
+            username=username,
+            email=f'{username}@example.com',
+            first_name=username,
+            last_name=username,
+            password='test-password',
+        )
+
+    @staticmethod
+    def create_token(user):
+        return Token.objects.get_or_create(user=user)[0].key
+
+    def authenticate(self, user):
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f'Token {self.create_token(user)}')
+
+    @staticmethod
+    def create_recipe(author, tags=(), ingredients=(), name='Рецепт'):
+        """Рецепт с тегами и ингредиентами {ингредиент: количество}."""
+        recipe = Recipe.objects.create(
+            author=author, name=name, text='Описание', cooking_time=10,
+            image='api/images/test.jpg')
+        for tag in tags:
+            RecipeTag.objects.create(recipe=recipe, tag=tag)
+        for ingredient, amount in dict(ingredients).items():
+            IngredientRecipe.objects.create(
+                recipe=recipe, ingredient=ingredient, amount=amount)
+        return recipe
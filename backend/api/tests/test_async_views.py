@@ -0,0 +1,50 @@
+from asgiref.sync import async_to_sync
+from django.test import override_settings
+from django.urls import include, path
+from rest_framework.authtoken.models import Token
+
+from ..async_views import get_urlpatterns
+from ..models import ShoppigCart
+from ..urls import router
+from .base import ApiTestCase
+
+urlpatterns = [
+    path('api/', include(get_urlpatterns(router.urls))),
+    path('api/', include(router.urls)),
+]
+
+
+class AsyncShoppingCartTests(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        for ingredients in ({self.flour: 200, self.milk: 300},
+                            {self.flour: 50, self.egg: 2}):
+            ShoppigCart.objects.create(user=self.user, recipe=(
+                self.create_recipe(self.author, ingredients=ingredients)))
+        self.token = Token.objects.create(user=self.user).key
+
+    async def download(self, file_format):
+        with override_settings(ROOT_URLCONF=__name__):
+            response = await self.async_client.get(
+                '/api/recipes/download_shopping_cart/',
+                {'format': file_format},
+                headers={'Authorization': f'Token {self.token}'})
+        self.assertTrue(response.streaming)
+        return b''.join([chunk async for chunk in response.streaming_content])
+
+    def test_download_matches_sync_view(self):
+        self.authenticate(self.user)
+        for file_format in ('txt', 'csv', 'json'):
+            with self.subTest(file_format=file_format):
+                response = self.client.get(
+                    '/api/recipes/download_shopping_cart/',
+                    {'format': file_format})
+                expected = b''.join(response.streaming_content)
+                self.assertIn(b'250', expected)
+                self.assertEqual(
+                    async_to_sync(self.download)(file_format), expected)
+
+    def test_empty_cart_is_empty_json_list(self):
+        ShoppigCart.objects.filter(user=self.user).delete()
+        self.assertEqual(async_to_sync(self.download)('json'), b'[]')
@@ -0,0 +1,57 @@
+from django.db.models import F
+from django.test import override_settings
+from rest_framework.authtoken.models import Token
+
+from ..authentication import get_token, get_token_cache, token_cache_key
+from ..models import CustomUser
+from .base import ApiTestCase
+
+
+class CachedTokenAuthenticationTests(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.key = Token.objects.create(user=self.user).key
+
+    def test_cache_holds_no_password_hash(self):
+        get_token(self.key)
+
+        cached = get_token_cache().get(token_cache_key(self.key))
+        self.assertNotIn(self.user.password, cached)
+        self.assertNotIsInstance(cached, (Token, CustomUser))
+
+    def test_saving_cached_user_keeps_fresh_counters(self):
+        get_token(self.key)
+        CustomUser.objects.filter(pk=self.user.pk).update(
+            followers_count=F('followers_count') + 3)
+
+        user = get_token(self.key).user
+        user.first_name = 'Новое имя'
+        user.save()
+
+        user = CustomUser.objects.get(pk=self.user.pk)
+        self.assertEqual(user.first_name, 'Новое имя')
+        self.assertEqual(user.followers_count, 3)
+        self.assertTrue(user.check_password('test-password'))
+
+    def test_deferred_fields_are_read_from_database(self):
+        get_token(self.key)
+        CustomUser.objects.filter(pk=self.user.pk).update(recipes_count=2)
+
+        self.assertEqual(get_token(self.key).user.recipes_count, 2)
+
+    def test_requests_reuse_cached_user(self):
+        self.authenticate(self.user)
+        self.client.get('/api/users/me/')
+
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/users/me/')
+
+        self.assertEqual(response.json()['id'], self.user.pk)
+
+    @override_settings(AUTH_TOKEN_CACHE=None)
+    def test_deleted_token_stops_working_without_cache(self):
+        self.assertIsNotNone(get_token(self.key))
+        Token.objects.filter(key=self.key).delete()
+
+        self.assertIsNone(get_token(self.key))
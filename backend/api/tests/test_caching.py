@@ -0,0 +1,33 @@
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from ..caching import recipes_cache_key
+from .base import ApiTestCase
+
+
+class RecipesCacheKeyTests(ApiTestCase):
+
+    def get_key(self, query):
+        request = Request(APIRequestFactory().get(f'/api/recipes/?{query}'))
+        return recipes_cache_key(request, 'list', '', generation=1)
+
+    def test_tags_match_changes_key(self):
+        query = 'tags=breakfast&tags=lunch'
+        self.assertNotEqual(
+            self.get_key(query), self.get_key(f'{query}&tags_match=all'))
+
+    def test_tags_order_does_not_change_key(self):
+        self.assertEqual(
+            self.get_key('tags=breakfast&tags=lunch'),
+            self.get_key('tags=lunch&tags=breakfast'))
+
+    def test_anonymous_any_and_all_are_cached_separately(self):
+        self.create_recipe(self.author, [self.breakfast])
+        self.create_recipe(self.author, [self.breakfast, self.lunch])
+        query = '/api/recipes/?tags=breakfast&tags=lunch'
+
+        any_response = self.client.get(query)
+        all_response = self.client.get(f'{query}&tags_match=all')
+
+        self.assertEqual(any_response.json()['count'], 2)
+        self.assertEqual(all_response.json()['count'], 1)
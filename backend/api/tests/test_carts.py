@@ -0,0 +1,55 @@
+from io import StringIO
+
+from django.core.management import call_command
+
+from ..models import CartIngredientTotal, Ingredient
+from .base import ApiTestCase
+
+
+class CartTotalsTests(ApiTestCase):
+
+    def get_totals(self):
+        return sorted(CartIngredientTotal.objects.values_list(
+            'user', 'name', 'measurement_unit', 'amount', 'recipes'))
+
+    def test_incremental_totals_match_rebuild(self):
+        flour_kg = Ingredient.objects.create(
+            name='мука', measurement_unit='кг')
+        pancakes = self.create_recipe(
+            self.author, ingredients={self.flour: 200, self.milk: 300})
+        bread = self.create_recipe(
+            self.author, ingredients={flour_kg: 1, self.egg: 2})
+        omelette = self.create_recipe(
+            self.author, ingredients={self.egg: 3, self.milk: 100})
+        ids = [pancakes.pk, bread.pk, omelette.pk]
+        other = self.create_user('other')
+
+        self.authenticate(self.user)
+        self.client.post(f'/api/recipes/{pancakes.pk}/shopping_cart/')
+        self.client.post(
+            '/api/recipes/shopping_cart/', {'ids': ids}, format='json')
+        self.client.post(f'/api/recipes/{bread.pk}/shopping_cart/')
+        self.client.delete(f'/api/recipes/{omelette.pk}/shopping_cart/')
+        self.authenticate(other)
+        self.client.post(
+            '/api/recipes/shopping_cart/', {'ids': ids}, format='json')
+        self.client.delete(
+            '/api/recipes/shopping_cart/', {'ids': [bread.pk]},
+            format='json')
+        self.authenticate(self.author)
+        response = self.client.patch(f'/api/recipes/{pancakes.pk}/', {
+            'tags': [self.breakfast.pk],
+            'ingredients': [
+                {'id': self.flour.pk, 'amount': 250},
+                {'id': flour_kg.pk, 'amount': 2},
+                {'id': self.egg.pk, 'amount': 1},
+            ],
+        }, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        response = self.client.delete(f'/api/recipes/{omelette.pk}/')
+        self.assertEqual(response.status_code, 204)
+
+        incremental = self.get_totals()
+        self.assertTrue(incremental)
+        call_command('rebuild_cart_totals', stdout=StringIO())
+        self.assertEqual(incremental, self.get_totals())
@@ -0,0 +1,46 @@
+from ..models import CustomUser, Favorite, Recipe, ShoppigCart, Subscription
+from ..serializers import RecipeSerializer
+from .base import ApiTestCase
+
+
+class CountersPreservedTests(ApiTestCase):
+
+    def test_password_change_keeps_user_counters(self):
+        self.authenticate(self.author)
+        # Первый запрос кеширует токен вместе с пользователем, и дальше
+        # request.user хранит счётчики, прочитанные до их изменения.
+        self.client.get('/api/users/me/')
+        self.create_recipe(self.author)
+        Subscription.objects.create(
+            subscriber=self.user, subscrib_to=self.author)
+
+        response = self.client.post('/api/users/set_password/', {
+            'current_password': 'test-password',
+            'new_password': 'new-test-password',
+        })
+
+        self.assertEqual(response.status_code, 204)
+        author = CustomUser.objects.get(pk=self.author.pk)
+        self.assertEqual(author.recipes_count, 1)
+        self.assertEqual(author.followers_count, 1)
+        self.assertTrue(author.check_password('new-test-password'))
+
+    def test_recipe_update_keeps_recipe_counters(self):
+        recipe = self.create_recipe(
+            self.author, [self.breakfast], {self.flour: 200})
+        # Рецепт прочитан до того, как счётчики изменились другим запросом.
+        stale_recipe = Recipe.objects.get(pk=recipe.pk)
+        Favorite.objects.create(user=self.user, recipe=recipe)
+        ShoppigCart.objects.create(user=self.user, recipe=recipe)
+
+        RecipeSerializer().update(stale_recipe, {
+            'name': 'Новое название',
+            'tags': [self.lunch.pk],
+            'ingredients': [{'id': self.milk.pk, 'amount': 300}],
+        })
+
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.name, 'Новое название')
+        self.assertEqual(recipe.favorites_count, 1)
+        self.assertEqual(recipe.in_carts_count, 1)
+        self.assertEqual(recipe.tags_mask, 1 << self.lunch.bit)
@@ -0,0 +1,33 @@
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from ..async_views import afilter_recipes
+from ..indexes import tag_cache
+from ..models import Recipe
+from .base import ApiTestCase
+
+
+class AsyncTagFilterTests(ApiTestCase):
+
+    def test_cache_reset_after_load_does_not_query_in_event_loop(self):
+        breakfast = self.create_recipe(self.author, [self.breakfast])
+        self.create_recipe(self.author, [self.lunch])
+        request = Request(APIRequestFactory().get(
+            '/api/recipes/?tags=breakfast'))
+        aload = tag_cache.aload
+
+        async def load_then_reset():
+            state = await aload()
+            # Сигнал Tag или ttl сбрасывает кеш сразу после загрузки.
+            tag_cache.invalidate()
+            return state
+
+        with mock.patch.object(tag_cache, 'aload', load_then_reset):
+            recipes = async_to_sync(afilter_recipes)(
+                request, Recipe.objects.all())
+
+        self.assertEqual(
+            list(recipes.values_list('pk', flat=True)), [breakfast.pk])
@@ -0,0 +1,102 @@
+from ..models import CustomUser, Favorite, Recipe, ShoppigCart, Subscription
+from .base import ApiTestCase
+
+
+class RepeatedWritesTests(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.recipes = [
+            self.create_recipe(self.author, name=f'Рецепт {number}')
+            for number in range(3)
+        ]
+        self.authenticate(self.user)
+
+    def assert_added(self, Model, counter, url, bulk_url):
+        recipe = self.recipes[0]
+        for _ in range(2):
+            response = self.client.post(url.format(recipe.pk))
+            self.assertEqual(response.status_code, 201, response.content)
+        ids = [recipe.pk for recipe in self.recipes]
+        for _ in range(2):
+            response = self.client.post(bulk_url, {'ids': ids}, format='json')
+            self.assertEqual(response.status_code, 201, response.content)
+            self.assertEqual(
+                [item['id'] for item in response.json()], ids)
+
+        self.assertEqual(Model.objects.filter(user=self.user).count(), 3)
+        self.assertEqual(
+            list(Recipe.objects.filter(pk__in=ids).values_list(
+                counter, flat=True)),
+            [1, 1, 1])
+
+    def assert_removed(self, Model, counter, url, bulk_url):
+        recipe = self.recipes[0]
+        self.assertEqual(self.client.delete(
+            url.format(recipe.pk)).status_code, 204)
+        self.assertEqual(self.client.delete(
+            url.format(recipe.pk)).status_code, 400)
+        ids = [recipe.pk for recipe in self.recipes]
+        for deleted in (2, 0):
+            response = self.client.delete(
+                bulk_url, {'ids': ids}, format='json')
+            self.assertEqual(response.json(), {'deleted': deleted})
+
+        self.assertFalse(Model.objects.exists())
+        self.assertEqual(
+            list(Recipe.objects.filter(pk__in=ids).values_list(
+                counter, flat=True)),
+            [0, 0, 0])
+
+    def test_favorite(self):
+        args = (Favorite, 'favorites_count', '/api/recipes/{}/favorite/',
+                '/api/recipes/favorite/')
+        self.assert_added(*args)
+        self.assert_removed(*args)
+
+    def test_shopping_cart(self):
+        args = (ShoppigCart, 'in_carts_count',
+                '/api/recipes/{}/shopping_cart/',
+                '/api/recipes/shopping_cart/')
+        self.assert_added(*args)
+        self.assert_removed(*args)
+
+    def test_subscribe(self):
+        other = self.create_user('other')
+        ids = [self.author.pk, other.pk]
+        for _ in range(2):
+            response = self.client.post(
+                f'/api/users/{self.author.pk}/subscribe/')
+            self.assertEqual(response.status_code, 201, response.content)
+            response = self.client.post(
+                '/api/users/subscribe/', {'ids': ids}, format='json')
+            self.assertEqual(response.status_code, 201, response.content)
+
+        self.assertEqual(
+            Subscription.objects.filter(subscriber=self.user).count(), 2)
+        self.assertEqual(
+            list(CustomUser.objects.filter(pk__in=ids).order_by(
+                'pk').values_list('followers_count', flat=True)),
+            [1, 1])
+
+        self.assertEqual(self.client.delete(
+            f'/api/users/{self.author.pk}/subscribe/').status_code, 204)
+        self.assertEqual(self.client.delete(
+            f'/api/users/{self.author.pk}/subscribe/').status_code, 400)
+        response = self.client.delete(
+            '/api/users/subscribe/', {'ids': ids}, format='json')
+        self.assertEqual(response.json(), {'deleted': 1})
+        self.assertEqual(
+            CustomUser.objects.get(pk=other.pk).followers_count, 0)
+
+    def test_add_increments_counter_instead_of_recounting(self):
+        # Счетчик меняется на число действительно добавленных строк и
+        # не пересчитывается по таблице избранного.
+        recipe = self.recipes[0]
+        Recipe.objects.filter(pk=recipe.pk).update(favorites_count=5)
+
+        for _ in range(2):
+            self.client.post(f'/api/recipes/{recipe.pk}/favorite/')
+
+        self.assertEqual(
+            Recipe.objects.get(pk=recipe.pk).favorites_count, 6)
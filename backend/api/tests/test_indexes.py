@@ -0,0 +1,47 @@
+from unittest import mock
+
+from ..indexes import RecipeIngredientIndex
+from .base import ApiTestCase
+
+
+class RecipeIngredientIndexTests(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.pancakes = self.create_recipe(
+            self.author, ingredients={self.flour: 200, self.milk: 300})
+        self.index = RecipeIngredientIndex(ttl=3600, sync_interval=3600)
+
+    def search(self, *ingredients):
+        return [match.recipe_id for match in self.index.search(
+            [ingredient.pk for ingredient in ingredients])]
+
+    def test_expired_index_is_rebuilt_in_background(self):
+        self.assertEqual(self.search(self.egg), [])
+        omelette = self.create_recipe(self.author, ingredients={self.egg: 3})
+        self.index.ttl = 0
+
+        with mock.patch('api.indexes.threading.Thread') as thread:
+            # Пока идет перестройка, поиск отвечает по прежнему индексу.
+            self.assertEqual(self.search(self.egg), [])
+            self.assertEqual(self.search(self.egg), [])
+        thread.assert_called_once()
+        thread.return_value.start.assert_called_once()
+
+        self.index._rebuild()
+        self.index.ttl = 3600
+        self.assertEqual(self.search(self.egg), [omelette.pk])
+
+    def test_refresh_during_rebuild_is_not_lost(self):
+        self.index.load()
+        self.index._pending = set()
+        scan = self.index._scan()
+        # Рецепт изменился после того, как перестройка прочитала связи.
+        omelette = self.create_recipe(self.author, ingredients={self.egg: 3})
+        self.index.refresh([omelette.pk])
+
+        with mock.patch.object(self.index, '_scan', return_value=scan):
+            self.index._rebuild()
+
+        self.assertIsNone(self.index._pending)
+        self.assertEqual(self.search(self.egg), [omelette.pk])
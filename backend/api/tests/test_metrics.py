@@ -0,0 +1,54 @@
+import json
+import os
+import tempfile
+
+from django.test import SimpleTestCase, override_settings
+
+from ..metrics import EXITED, MetricsRegistry
+
+
+class MetricsRegistryTests(SimpleTestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = override_settings(METRICS_DIR=directory.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.registry = MetricsRegistry()
+
+    def observe(self, registry, count):
+        for _ in range(count):
+            registry.observe(('recipes', 'list', 'GET'), 0.02, 3, 0.01, 100)
+        registry.flush()
+
+    def test_dead_worker_snapshot_is_folded(self):
+        worker = MetricsRegistry()
+        self.observe(worker, 2)
+        worker_file = worker.directory / f'{os.getpid()}.json'
+        dead_pid = os.getpid() + 1
+        os.replace(worker_file, worker.directory / f'{dead_pid}.json')
+
+        self.registry.mark_processes_dead([dead_pid])
+        self.observe(self.registry, 1)
+
+        self.assertFalse((worker.directory / f'{dead_pid}.json').exists())
+        self.assertTrue((worker.directory / f'{EXITED}.json').exists())
+        series = self.registry.collect()['recipes|list|GET']
+        self.assertEqual(series['count'], 3)
+        self.assertEqual(series['queries'], 9)
+
+    def test_reused_pid_does_not_reset_counters(self):
+        self.observe(MetricsRegistry(), 2)
+        self.registry.mark_processes_dead()
+        # Новый воркер с тем же PID начинает с пустых метрик.
+        self.observe(self.registry, 1)
+
+        series = self.registry.collect()['recipes|list|GET']
+        self.assertEqual(series['count'], 3)
+        self.assertCountEqual(
+            [path.name for path in self.registry.directory.glob('*.json')],
+            [f'{EXITED}.json', f'{os.getpid()}.json'])
+        exited = json.loads(
+            (self.registry.directory / f'{EXITED}.json').read_text())
+        self.assertEqual(exited['recipes|list|GET']['count'], 2)
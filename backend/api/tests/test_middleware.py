@@ -0,0 +1,54 @@
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.test import override_settings
+
+from ..models import ShoppigCart
+from .base import ApiTestCase
+
+
+class StreamingMetricsTests(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        recipe = self.create_recipe(
+            self.author, ingredients={self.flour: 200, self.milk: 300})
+        ShoppigCart.objects.create(user=self.user, recipe=recipe)
+        observe = mock.patch('api.middleware.registry.observe')
+        self.observe = observe.start()
+        self.addCleanup(observe.stop)
+
+    def assert_observed(self, content):
+        self.observe.assert_called_once()
+        labels, duration, queries, query_time, size = (
+            self.observe.call_args.args)
+        self.assertGreater(queries, 0)
+        self.assertGreater(query_time, 0)
+        self.assertEqual(size, len(content))
+
+    def test_sync_stream_is_measured_when_consumed(self):
+        self.authenticate(self.user)
+        response = self.client.get('/api/recipes/download_shopping_cart/')
+        self.observe.assert_not_called()
+
+        content = b''.join(response.streaming_content)
+
+        self.assert_observed(content)
+        self.assertEqual(
+            self.observe.call_args.args[0],
+            ('RecipesViewSet', 'get_a_list_to_shopping_cart', 'GET'))
+
+    def test_async_stream_is_measured_when_consumed(self):
+        token = self.create_token(self.user)
+
+        async def download():
+            with override_settings(
+                    ROOT_URLCONF='api.tests.test_async_views'):
+                response = await self.async_client.get(
+                    '/api/recipes/download_shopping_cart/',
+                    headers={'Authorization': f'Token {token}'})
+            self.observe.assert_not_called()
+            return b''.join(
+                [chunk async for chunk in response.streaming_content])
+
+        self.assert_observed(async_to_sync(download)())
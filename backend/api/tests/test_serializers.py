@@ -0,0 +1,86 @@
+from datetime import datetime, timezone
+from decimal import Decimal
+
+from django.contrib.auth.models import AnonymousUser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from ..models import Favorite, Recipe, ShoppigCart, Subscription
+from ..renderers import ORJSONRenderer
+from ..serializers import RecipeReadSerializer, RecipeSerializer
+from .base import ApiTestCase
+
+RENDITIONS = {
+    'thumb': 'api/images/renditions/test_thumb.jpg',
+    'thumb_webp': 'api/images/renditions/test_thumb.webp',
+    'detail': 'api/images/renditions/test_detail.jpg',
+    'detail_webp': 'api/images/renditions/test_detail.webp',
+}
+
+
+class RecipeReadSerializerTests(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        with_renditions = self.create_recipe(
+            self.author, [self.breakfast, self.lunch],
+            {self.flour: 200, self.milk: 300}, name='С копиями')
+        Recipe.objects.filter(pk=with_renditions.pk).update(
+            image_renditions={'source': 'api/images/test.jpg', **RENDITIONS})
+        stale = self.create_recipe(
+            self.author, [self.lunch], {self.egg: 3}, name='Старые копии')
+        Recipe.objects.filter(pk=stale.pk).update(
+            image_renditions={'source': 'api/images/old.jpg', **RENDITIONS})
+        without_renditions = self.create_recipe(
+            self.user, [self.breakfast], {self.milk: 1},
+            name='Без копий « »')
+        Favorite.objects.create(user=self.user, recipe=with_renditions)
+        ShoppigCart.objects.create(user=self.user, recipe=stale)
+        ShoppigCart.objects.create(user=self.user, recipe=without_renditions)
+        Subscription.objects.create(
+            subscriber=self.user, subscrib_to=self.author)
+
+    def render(self, serializer_class, renderer, user):
+        request = Request(APIRequestFactory().get('/api/recipes/'))
+        request.user = user
+        recipes = Recipe.objects.with_related().with_user_flags(user)
+        return renderer.render(serializer_class(
+            recipes, many=True, context={'request': request}).data)
+
+    def test_matches_recipe_serializer_byte_for_byte(self):
+        for user in (AnonymousUser(), self.user):
+            with self.subTest(user=user):
+                expected = self.render(RecipeSerializer, JSONRenderer(), user)
+                for serializer_class in (RecipeSerializer,
+                                         RecipeReadSerializer):
+                    for renderer in (JSONRenderer(), ORJSONRenderer()):
+                        self.assertEqual(
+                            self.render(serializer_class, renderer, user),
+                            expected)
+
+    def test_flags_and_renditions_are_covered(self):
+        data = RecipeReadSerializer(
+            Recipe.objects.with_related().with_user_flags(self.user),
+            many=True).data
+        recipes = {recipe['name']: recipe for recipe in data}
+        self.assertTrue(recipes['С копиями']['is_favorited'])
+        self.assertTrue(recipes['С копиями']['author']['is_subscribed'])
+        self.assertTrue(recipes['Старые копии']['is_in_shopping_cart'])
+        self.assertIn('thumb.webp', recipes['С копиями']['image_thumb_webp'])
+        self.assertEqual(
+            recipes['Старые копии']['image_thumb'],
+            recipes['Старые копии']['image'])
+
+
+class ORJSONRendererTests(ApiTestCase):
+
+    def test_matches_json_renderer(self):
+        data = {
+            'amount': Decimal('1.250'),
+            'created_at': datetime(2024, 1, 2, 3, 4, 5, 678901, timezone.utc),
+            'text': 'строка\u2028\u2029',
+            1: [None, True, 1.5],
+        }
+        self.assertEqual(
+            ORJSONRenderer().render(data), JSONRenderer().render(data))
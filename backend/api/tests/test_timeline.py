@@ -0,0 +1,60 @@
+from unittest import mock
+
+from django.test import override_settings
+
+from ..images import executor
+from ..models import Subscription, TimelineEntry
+from ..timeline import fan_out_in_background
+from .base import ApiTestCase
+
+
+class FanoutTests(ApiTestCase):
+
+    def test_new_recipe_fans_out_in_background(self):
+        Subscription.objects.create(
+            subscriber=self.user, subscrib_to=self.author)
+
+        with mock.patch.object(executor, 'submit') as submit:
+            with self.captureOnCommitCallbacks(execute=True):
+                recipe = self.create_recipe(self.author)
+
+        submit.assert_any_call(fan_out_in_background, recipe.pk)
+        self.assertFalse(TimelineEntry.objects.exists())
+
+
+@override_settings(FEED_FANOUT_FOLLOWERS=2)
+class FanoutThresholdTests(ApiTestCase):
+
+    def test_followers_get_recipes_when_author_drops_below_threshold(self):
+        reader = self.create_user('reader')
+        for follower in (self.user, reader):
+            Subscription.objects.create(
+                subscriber=follower, subscrib_to=self.author)
+        # Рецепты автора с двумя подписчиками читаются из таблицы рецептов.
+        recipe = self.create_recipe(self.author)
+        self.assertFalse(TimelineEntry.objects.exists())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Subscription.objects.filter(subscriber=reader).delete()
+
+        self.assertQuerysetEqual(
+            TimelineEntry.objects.values_list('user', 'recipe'),
+            [(self.user.pk, recipe.pk)])
+        self.authenticate(self.user)
+        response = self.client.get('/api/recipes/feed/')
+        self.assertEqual(
+            [item['id'] for item in response.json()['results']],
+            [recipe.pk])
+
+    def test_no_backfill_while_author_stays_above_threshold(self):
+        for username in ('first', 'second', 'third'):
+            Subscription.objects.create(
+                subscriber=self.create_user(username),
+                subscrib_to=self.author)
+        self.create_recipe(self.author)
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            Subscription.objects.filter(subscriber__username='third').delete()
+
+        self.assertFalse(TimelineEntry.objects.exists())
+        self.assertEqual(callbacks, [])
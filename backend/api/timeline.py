@@ -0,0 +1,169 @@
+import logging
+from itertools import islice
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Q
+
+from .images import executor
+from .models import CustomUser, Recipe, Subscription, TimelineEntry
+
+BACKFILL_SIZE = 100
+BATCH_SIZE = 1000
+
+logger = logging.getLogger(__name__)
+
+
+def fans_out(author):
+    """Раскладываются ли рецепты автора по лентам подписчиков."""
+    return author.followers_count < settings.FEED_FANOUT_FOLLOWERS
+
+
+def insert_entries(entries):
+    """Записывает элементы ленты пачками, пропуская уже существующие."""
+    entries = iter(entries)
+    while batch := list(islice(entries, BATCH_SIZE)):
+        TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def recent_recipes(author):
+    return list(Recipe.objects.filter(author=author).order_by(
+        '-created_at', '-id').values_list('id', 'created_at')[:BACKFILL_SIZE])
+
+
+def make_entries(user_id, author_id, recipes):
+    return (
+        TimelineEntry(
+            user_id=user_id,
+            author_id=author_id,
+            recipe_id=recipe_id,
+            created_at=created_at
+        )
+        for recipe_id, created_at in recipes
+    )
+
+
+def fan_out(recipe_id):
+    """Добавляет новый рецепт в ленты всех подписчиков автора."""
+    recipe = Recipe.objects.select_related('author').only(
+        'created_at', 'author__followers_count').filter(pk=recipe_id).first()
+    if recipe is None or not fans_out(recipe.author):
+        return
+    followers = Subscription.objects.filter(
+        subscrib_to_id=recipe.author_id
+    ).values_list('subscriber_id', flat=True)
+    insert_entries(
+        entry
+        for follower_id in followers.iterator(chunk_size=BATCH_SIZE)
+        for entry in make_entries(
+            follower_id, recipe.author_id, [(recipe.pk, recipe.created_at)])
+    )
+
+
+def fan_out_in_background(recipe_id):
+    try:
+        fan_out(recipe_id)
+    except Exception:
+        logger.exception(
+            'Не удалось добавить рецепт %s в ленты подписчиков', recipe_id)
+    finally:
+        connections.close_all()
+
+
+def schedule_fan_out(recipe_id):
+    """Ставит раскладку рецепта по лентам в фоновый пул потоков, чтобы
+    автор не ждал записи в ленты всех подписчиков."""
+    return executor.submit(fan_out_in_background, recipe_id)
+
+
+def backfill(user_id, author):
+    """Добавляет в ленту последние рецепты автора после подписки."""
+    if fans_out(author):
+        insert_entries(
+            make_entries(user_id, author.pk, recent_recipes(author)))
+
+
+def crossed_fanout_threshold(author_id):
+    """Опустилось ли число подписчиков автора только что ниже порога,
+    после которого его рецепты снова раскладываются по лентам."""
+    return CustomUser.objects.filter(
+        pk=author_id,
+        followers_count=settings.FEED_FANOUT_FOLLOWERS - 1
+    ).exists()
+
+
+def backfill_followers(author):
+    """Добавляет последние рецепты автора в ленты всех его подписчиков."""
+    recipes = recent_recipes(author)
+    if not recipes:
+        return
+    followers = Subscription.objects.filter(
+        subscrib_to=author).values_list('subscriber_id', flat=True)
+    insert_entries(
+        entry
+        for follower_id in followers.iterator(chunk_size=BATCH_SIZE)
+        for entry in make_entries(follower_id, author.pk, recipes)
+    )
+
+
+def resume_fanout(author_id):
+    """Заполняет ленты подписчиков автора, который перестал читаться из
+    таблицы рецептов: пока подписчиков было много, его рецепты по лентам
+    не раскладывались."""
+    author = CustomUser.objects.only('followers_count').filter(
+        pk=author_id).first()
+    if author is not None and fans_out(author):
+        backfill_followers(author)
+
+
+def prune(user_id, author_id):
+    """Убирает из ленты рецепты автора после отписки."""
+    TimelineEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+def rebuild():
+    """Заново собирает ленты всех пользователей по подпискам."""
+    TimelineEntry.objects.all().delete()
+    authors = CustomUser.objects.filter(
+        followers_count__gt=0,
+        followers_count__lt=settings.FEED_FANOUT_FOLLOWERS
+    ).only('pk')
+    for author in authors.iterator():
+        backfill_followers(author)
+
+
+def before(position, created_at, pk):
+    """Условие «строго после позиции» для сортировки по убыванию."""
+    if position is None:
+        return Q()
+    created, identifier = position
+    return Q(**{f'{created_at}__lt': created}) | Q(
+        **{created_at: created, f'{pk}__lt': identifier})
+
+
+class Feed:
+    """Лента рецептов авторов, на которых подписан пользователь.
+
+    Рецепты обычных авторов читаются из таблицы ленты одним проходом по
+    индексу (user, created_at, recipe). Рецепты авторов с большим числом
+    подписчиков по лентам не раскладываются и дочитываются из таблицы
+    рецептов, после чего обе выборки сливаются по дате публикации.
+    """
+    def __init__(self, user, recipes):
+        self.user = user
+        self.recipes = recipes
+
+    def page(self, limit, position=None):
+        keys = set(TimelineEntry.objects.filter(
+            before(position, 'created_at', 'recipe_id'), user=self.user
+        ).order_by('-created_at', '-recipe_id').values_list(
+            'created_at', 'recipe_id')[:limit])
+        keys.update(Recipe.objects.filter(
+            before(position, 'created_at', 'id'),
+            author__subscrib_to__subscriber=self.user,
+            author__followers_count__gte=settings.FEED_FANOUT_FOLLOWERS,
+        ).order_by('-created_at', '-id').values_list(
+            'created_at', 'id')[:limit])
+        ids = [pk for _, pk in sorted(keys, reverse=True)[:limit]]
+        recipes = self.recipes.order_by().in_bulk(ids)
+        return [recipes[pk] for pk in ids if pk in recipes]
@@ -0,0 +1,28 @@
+from decimal import Decimal
+
+# Единица измерения -> (базовая единица, множитель). Ингредиенты с одним
+# названием и совместимыми единицами складываются в списке покупок.
+UNITS = {
+    'мг': ('г', Decimal('0.001')),
+    'г': ('г', Decimal(1)),
+    'кг': ('г', Decimal(1000)),
+    'мл': ('мл', Decimal(1)),
+    'л': ('мл', Decimal(1000)),
+    'ч. л.': ('мл', Decimal(5)),
+    'ст. л.': ('мл', Decimal(15)),
+    'стакан': ('мл', Decimal(250)),
+}
+
+
+def normalize(measurement_unit, amount):
+    """Переводит количество в базовую единицу измерения."""
+    unit, factor = UNITS.get(
+        measurement_unit.strip().lower(), (measurement_unit, Decimal(1)))
+    return unit, Decimal(amount) * factor
+
+
+def format_amount(amount):
+    """Целое количество без дробной части, иначе число с точкой."""
+    if amount == amount.to_integral_value():
+        return int(amount)
+    return float(amount)
@@ -1,8 +1,10 @@
+from django.conf import settings
 from django.urls import include, path, re_path
 from rest_framework import routers
 
-from .views import (CustomUserViewSet, IngredientsViewSet, RecipesViewSet,
-                    TagViewSet)
+from .async_views import get_urlpatterns as get_async_urlpatterns
+from .views import (CustomUserViewSet, IngredientsViewSet, MetricsView,
+                    RecipesViewSet, TagViewSet)
 
 router = routers.SimpleRouter()
 
@@ -13,5 +15,10 @@ router.register(r'ingredients', IngredientsViewSet, basename='ingredients')
 
 urlpatterns = [
     re_path(r'^auth/', include('djoser.urls.authtoken')),
+    path('metrics', MetricsView.as_view(), name='metrics'),
     path('', include(router.urls)),
 ]
+
+if settings.ASYNC_API:
+    urlpatterns.insert(-1, path('', include(
+        get_async_urlpatterns(router.urls))))
@@ -1,23 +1,42 @@
-from django.db.models import Sum
-from django.http import HttpResponse
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Value
+from django.http import HttpResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import mixins, status, viewsets
 from rest_framework.decorators import action
 from rest_framework.exceptions import ValidationError
-from rest_framework.permissions import (IsAuthenticated,
+from rest_framework.permissions import (IsAdminUser, IsAuthenticated,
                                         IsAuthenticatedOrReadOnly)
 from rest_framework.response import Response
+from rest_framework.views import APIView
 
+from .caching import (AnonymousRecipesCacheMixin, catalogue_etag,
+                      patch_catalogue_cache_control)
+from .carts import add_to_totals, lock_cart
+from .counters import increment_counters, missing_rows
 from .filters import RecipesFilter
-from .models import (CustomUser, Favorite, Ingredient, Recipe, ShoppigCart,
-                     Subscription, Tag)
-from .paginators import CustomNumberPaginator
+from .indexes import ingredient_index, recipe_ingredient_index, tag_cache
+from .metrics import registry
+from .models import (CartIngredientTotal, CustomUser, Favorite, Ingredient,
+                     Recipe, ShoppigCart, Subscription, Tag)
+from .paginators import CustomNumberPaginator, FeedPaginator, ListPaginator
 from .permissions import IsOwner
-from .serializers import (CustomUserSerializer, IngredientSerializer,
-                          PasswordChangeSerializer, RecipeSerializer,
+from .renderers import (ShoppingListCSVRenderer, ShoppingListJSONRenderer,
+                        ShoppingListTextRenderer)
+from .serializers import (CustomUserSerializer, IdsSerializer,
+                          IngredientSerializer, PasswordChangeSerializer,
+                          RecipeReadSerializer, RecipeSerializer,
                           RegisterSerializer, ShoppingCartFavoriteSerializer,
                           SubscriptionSerializer, TagSerializer)
+from .timeline import Feed, backfill
+from .units import format_amount
+
+# Действия, ответы которых строит RecipeReadSerializer.
+READ_ACTIONS = ('list', 'retrieve', 'get_feed', 'get_by_ingredients')
+MAX_INGREDIENTS_QUERY = 100
 
 
 class CustomUserViewSet(mixins.ListModelMixin, mixins.CreateModelMixin,
@@ -28,6 +47,15 @@ class CustomUserViewSet(mixins.ListModelMixin, mixins.CreateModelMixin,
     pagination_class = CustomNumberPaginator
     serializer_class = CustomUserSerializer
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        user = self.request.user
+        if not user.is_authenticated:
+            return queryset.annotate(is_subscribed=Value(False))
+        return queryset.annotate(is_subscribed=Exists(
+            Subscription.objects.filter(
+                subscriber=user, subscrib_to=OuterRef('pk'))))
+
     def get_serializer_class(self):
         if self.action == 'create':
             return RegisterSerializer
@@ -50,7 +78,9 @@ class CustomUserViewSet(mixins.ListModelMixin, mixins.CreateModelMixin,
         password = serializer.validated_data['new_password']
         user = request.user
         user.set_password(password)
-        user.save()
+        # Счётчики пользователя обновляются отдельными UPDATE, поэтому
+        # сохраняется только пароль, иначе они откатятся к старым значениям.
+        user.save(update_fields=['password'])
         return Response(
             {"detail": "Пароль успешно изменен"},
             status=status.HTTP_204_NO_CONTENT
@@ -66,12 +96,32 @@ class CustomUserViewSet(mixins.ListModelMixin, mixins.CreateModelMixin,
                     'recipes_limit должен быть целым числом')
         return recipes_limit
 
+    def get_subscriptions_queryset(self, queryset):
+        return queryset.annotate(
+            is_subscribed=Value(True)
+        ).order_by('id')
+
+    def get_authors_recipes(self, authors, recipes_limit):
+        return Recipe.objects.top_by_author(
+            [author.id for author in authors], recipes_limit).only(
+            'id', 'author_id', 'name', 'image', 'image_renditions',
+            'cooking_time')
+
+    def attach_recipes(self, authors, recipes_limit, authors_recipes=None):
+        if authors_recipes is None:
+            authors_recipes = self.get_authors_recipes(authors, recipes_limit)
+        recipes = {}
+        for recipe in authors_recipes:
+            recipes.setdefault(recipe.author_id, []).append(recipe)
+        for author in authors:
+            author.limited_recipes = recipes.get(author.id, [])
+        return authors
+
     @action(detail=False, methods=['get'], url_path='subscriptions',
             permission_classes=[IsAuthenticated])
     def get_user_subscriptions(self, request):
-        subscriptions = CustomUser.objects.filter(
-            pk__in=request.user.subscriber.all().values_list(
-                'subscrib_to', flat=True))
+        subscriptions = self.get_subscriptions_queryset(
+            CustomUser.objects.filter(subscrib_to__subscriber=request.user))
         recipes_limit = self.get_recipes_limit(request)
         context = {
             'request': request,
@@ -79,49 +129,101 @@ class CustomUserViewSet(mixins.ListModelMixin, mixins.CreateModelMixin,
             'recipes_limit': recipes_limit
         }
         paginator = CustomNumberPaginator()
-        paginated_queryset = paginator.paginate_queryset(
-            subscriptions, request)
+        paginated_queryset = self.attach_recipes(
+            paginator.paginate_queryset(subscriptions, request),
+            recipes_limit
+        )
         serializer = SubscriptionSerializer(
             paginated_queryset, many=True, read_only=True, context=context)
         return paginator.get_paginated_response(serializer.data)
 
+    def subscribe(self, subscriber, authors):
+        """Подписывает одним INSERT, повторная подписка не ошибка."""
+        added = set(missing_rows(
+            Subscription, 'subscriber', subscriber.pk, 'subscrib_to',
+            [author.pk for author in authors]))
+        authors = [author for author in authors if author.pk in added]
+        Subscription.objects.bulk_create(
+            (Subscription(subscriber=subscriber, subscrib_to=author)
+             for author in authors),
+            ignore_conflicts=True
+        )
+        increment_counters(Subscription, [author.pk for author in authors])
+        for author in authors:
+            backfill(subscriber.pk, author)
+
+    def get_subscribed_authors(self, request, ids):
+        recipes_limit = self.get_recipes_limit(request)
+        authors = self.attach_recipes(
+            self.get_subscriptions_queryset(
+                CustomUser.objects.filter(pk__in=ids)),
+            recipes_limit
+        )
+        return SubscriptionSerializer(
+            authors, many=True, context={
+                'user': request.user, 'recipes_limit': recipes_limit})
+
     @action(detail=True, methods=['post', 'delete'], url_path='subscribe',
             permission_classes=[IsAuthenticated])
+    @transaction.atomic
     def add_and_destroy_subscribe(self, request, pk=None):
         subscriber = request.user
-        subscrib_to = get_object_or_404(CustomUser, id=pk)
         if request.method == 'POST':
+            subscrib_to = get_object_or_404(
+                CustomUser.objects.only('followers_count'), id=pk)
             if subscriber == subscrib_to:
                 return Response(
                     {'message': 'Вы не можете подписаться на самого себя'},
                     status=status.HTTP_400_BAD_REQUEST
                 )
-            if Subscription.objects.filter(
-                    subscriber=subscriber, subscrib_to=subscrib_to).exists():
-                return Response(
-                    {'message': 'Вы уже подписаны на данного пользователя'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            Subscription.objects.create(
-                subscriber=subscriber, subscrib_to=subscrib_to)
-            recipes_limit = self.get_recipes_limit(request)
-            serializer = SubscriptionSerializer(
-                subscrib_to, context={
-                    'user': subscriber, 'recipes_limit': recipes_limit})
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
-        subscribe_item = Subscription.objects.filter(
-            subscriber=subscriber, subscrib_to=subscrib_to)
-        if not subscribe_item.exists():
+            self.subscribe(subscriber, [subscrib_to])
+            serializer = self.get_subscribed_authors(
+                request, [subscrib_to.pk])
+            return Response(
+                serializer.data[0], status=status.HTTP_201_CREATED)
+        deleted, _ = Subscription.objects.filter(
+            subscriber=subscriber, subscrib_to_id=pk).delete()
+        if not deleted:
+            get_object_or_404(CustomUser, id=pk)
             return Response(
                 {'message': 'Вы не подписаны на данного пользователя'},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        subscribe_item.delete()
         return Response(
             {'message': 'Вы успешно отписались от пользователя'},
             status=status.HTTP_204_NO_CONTENT
         )
 
+    @action(detail=False, methods=['post', 'delete'], url_path='subscribe',
+            url_name='bulk-subscribe', permission_classes=[IsAuthenticated])
+    @transaction.atomic
+    def bulk_add_and_destroy_subscribe(self, request):
+        serializer = IdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = serializer.validated_data['ids']
+        subscriber = request.user
+        if request.method == 'POST':
+            if subscriber.pk in ids:
+                return Response(
+                    {'message': 'Вы не можете подписаться на самого себя'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            authors = CustomUser.objects.only('followers_count').in_bulk(ids)
+            missing = [pk for pk in ids if pk not in authors]
+            if missing:
+                return Response(
+                    {'message': 'Нет таких пользователей', 'ids': missing},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            self.subscribe(subscriber, list(authors.values()))
+            return Response(
+                self.get_subscribed_authors(request, ids).data,
+                status=status.HTTP_201_CREATED
+            )
+        deleted, _ = Subscription.objects.filter(
+            subscriber=subscriber, subscrib_to_id__in=ids).delete()
+        return Response({'deleted': deleted})
+
 
 class TagViewSet(mixins.ListModelMixin, mixins.RetrieveModelMixin,
                  viewsets.GenericViewSet):
@@ -130,6 +232,11 @@ class TagViewSet(mixins.ListModelMixin, mixins.RetrieveModelMixin,
     serializer_class = TagSerializer
     pagination_class = None
 
+    @method_decorator(condition(
+        etag_func=lambda request: catalogue_etag(tag_cache, request)))
+    def list(self, request, *args, **kwargs):
+        return patch_catalogue_cache_control(Response(tag_cache.all()))
+
 
 class IngredientsViewSet(mixins.ListModelMixin, mixins.RetrieveModelMixin,
                          viewsets.GenericViewSet):
@@ -138,15 +245,20 @@ class IngredientsViewSet(mixins.ListModelMixin, mixins.RetrieveModelMixin,
     serializer_class = IngredientSerializer
     pagination_class = None
 
-    def get_queryset(self):
-        queryset = super().get_queryset()
-        name = self.request.query_params.get('name')
+    @method_decorator(condition(
+        etag_func=lambda request: catalogue_etag(
+            ingredient_index, request,
+            request.query_params.get('name', '').casefold())))
+    def list(self, request, *args, **kwargs):
+        name = request.query_params.get('name')
         if name:
-            queryset = queryset.filter(name__istartswith=name)
-        return queryset
+            response = Response(ingredient_index.startswith(name))
+        else:
+            response = Response(ingredient_index.all())
+        return patch_catalogue_cache_control(response)
 
 
-class RecipesViewSet(viewsets.ModelViewSet):
+class RecipesViewSet(AnonymousRecipesCacheMixin, viewsets.ModelViewSet):
     """Viewset Рецептов."""
     queryset = Recipe.objects.all()
     serializer_class = RecipeSerializer
@@ -155,66 +267,226 @@ class RecipesViewSet(viewsets.ModelViewSet):
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipesFilter
 
+    def get_queryset(self):
+        return super().get_queryset().with_related().with_user_flags(
+            self.request.user)
+
+    def get_serializer_class(self):
+        if (self.action in READ_ACTIONS
+                and self.request.accepted_renderer.format == 'json'):
+            return RecipeReadSerializer
+        return super().get_serializer_class()
+
+    def perform_create(self, serializer):
+        serializer.save()
+        serializer.instance = self.get_queryset().get(
+            pk=serializer.instance.pk)
+
+    def perform_update(self, serializer):
+        serializer.save()
+        serializer.instance = self.get_queryset().get(
+            pk=serializer.instance.pk)
+
     @action(
         detail=False,
         methods=['get'],
-        url_path='download_shopping_cart',
+        url_path='feed',
         permission_classes=[IsAuthenticated]
     )
-    def get_a_list_to_shopping_cart(self, request):
-        shopping_list = ShoppigCart.objects.filter(user=request.user)
-        ingredient_quantities = shopping_list.values(
-            'recipe__ingredientrecipe__ingredient__name',
-            'recipe__ingredientrecipe__ingredient__measurement_unit'
-        ).annotate(
-            total_amount=Sum('recipe__ingredientrecipe__amount')
-        ).values_list(
-            'recipe__ingredientrecipe__ingredient__name',
-            'recipe__ingredientrecipe__ingredient__measurement_unit',
-            'total_amount'
+    def get_feed(self, request):
+        paginator = FeedPaginator()
+        recipes = paginator.paginate_queryset(
+            Feed(request.user, self.get_queryset()), request)
+        serializer = self.get_serializer(recipes, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+    def get_ingredient_ids(self, request):
+        try:
+            ingredient_ids = {
+                int(value)
+                for values in request.query_params.getlist('ids')
+                for value in values.split(',') if value.strip()
+            }
+        except ValueError:
+            raise ValidationError(
+                'ids должен содержать id ингредиентов через запятую')
+        if not ingredient_ids:
+            raise ValidationError('Укажите id ингредиентов в параметре ids')
+        if len(ingredient_ids) > MAX_INGREDIENTS_QUERY:
+            raise ValidationError(
+                f'Можно указать не больше {MAX_INGREDIENTS_QUERY} '
+                f'ингредиентов')
+        return ingredient_ids
+
+    def get_max_missing(self, request):
+        max_missing = request.query_params.get('max_missing', None)
+        if max_missing is None:
+            return None
+        try:
+            max_missing = int(max_missing)
+            if max_missing < 0:
+                raise ValueError
+        except ValueError:
+            raise ValidationError(
+                'max_missing должен быть неотрицательным целым числом')
+        return max_missing
+
+    @action(detail=False, methods=['get'], url_path='by_ingredients')
+    def get_by_ingredients(self, request):
+        """Рецепты, которые можно приготовить из указанных ингредиентов,
+        по доле имеющихся ингредиентов рецепта."""
+        paginator = ListPaginator()
+        matches = paginator.paginate_queryset(
+            recipe_ingredient_index.search(
+                self.get_ingredient_ids(request),
+                self.get_max_missing(request)),
+            request
         )
+        recipes = self.get_queryset().in_bulk(
+            [match.recipe_id for match in matches])
+        # Рецепты, удаленные другим процессом, еще могут быть в индексе.
+        matches = [match for match in matches if match.recipe_id in recipes]
+        data = self.get_serializer(
+            [recipes[match.recipe_id] for match in matches], many=True).data
+        for recipe, match in zip(data, matches):
+            recipe['matched_ingredients_count'] = match.matched
+            recipe['missing_ingredients_count'] = (
+                match.required - match.matched)
+        return paginator.get_paginated_response(data)
 
-        data = ''
-        for ingredient_info in ingredient_quantities:
-            name, measurement_unit, amount = ingredient_info
-            data += f'{name.capitalize()} ({measurement_unit}) - {amount}\n'
+    @action(detail=True, methods=['get'], url_path='similar')
+    def get_similar(self, request, pk=None):
+        try:
+            limit = int(request.query_params.get('limit', 10))
+        except ValueError:
+            raise ValidationError('limit должен быть целым числом')
+        recipes = self.get_short_recipes().filter(
+            similar_for__recipe_id=pk
+        ).order_by('-similar_for__score')[:max(1, min(limit, 20))]
+        if not recipes:
+            get_object_or_404(Recipe, id=pk)
+        serializer = ShoppingCartFavoriteSerializer(recipes, many=True)
+        return Response(serializer.data)
+
+    def get_cart_totals(self, user):
+        return CartIngredientTotal.objects.filter(user=user).order_by(
+            'name', 'measurement_unit')
 
-        response = HttpResponse(data, content_type='text/plain')
-        response['Content-Disposition'] = ('attachment; '
-                                           'filename="shopping_list.txt"')
+    @action(
+        detail=False,
+        methods=['get'],
+        url_path='shopping_cart/summary',
+        permission_classes=[IsAuthenticated]
+    )
+    def get_shopping_cart_summary(self, request):
+        return Response([
+            {
+                'name': name,
+                'measurement_unit': measurement_unit,
+                'amount': format_amount(amount),
+                'recipes': recipes,
+            }
+            for name, measurement_unit, amount, recipes in (
+                self.get_cart_totals(request.user).values_list(
+                    'name', 'measurement_unit', 'amount', 'recipes'))
+        ])
+
+    @action(
+        detail=False,
+        methods=['get'],
+        url_path='download_shopping_cart',
+        permission_classes=[IsAuthenticated],
+        renderer_classes=[ShoppingListTextRenderer, ShoppingListCSVRenderer,
+                          ShoppingListJSONRenderer]
+    )
+    def get_a_list_to_shopping_cart(self, request):
+        ingredients = (
+            (name, measurement_unit, format_amount(amount))
+            for name, measurement_unit, amount in self.get_cart_totals(
+                request.user).values_list(
+                'name', 'measurement_unit', 'amount').iterator()
+        )
+
+        renderer = request.accepted_renderer
+        response = StreamingHttpResponse(
+            renderer.stream(ingredients),
+            content_type=f'{renderer.media_type}; charset=utf-8'
+        )
+        response['Content-Disposition'] = (
+            'attachment; '
+            f'filename="shopping_list.{renderer.format}"'
+        )
         return response
 
+    def add_recipes(self, Model, user, recipe_ids):
+        """Добавляет рецепты одним INSERT, повторное добавление не ошибка."""
+        recipe_ids = missing_rows(Model, 'user', user.pk, 'recipe', recipe_ids)
+        Model.objects.bulk_create(
+            (Model(user=user, recipe_id=recipe_id)
+             for recipe_id in recipe_ids),
+            ignore_conflicts=True
+        )
+        increment_counters(Model, recipe_ids)
+        if Model is ShoppigCart:
+            add_to_totals(user.pk, recipe_ids)
+
+    def remove_recipes(self, Model, user, recipe_ids):
+        """Удаляет рецепты и возвращает число удаленных строк."""
+        if Model is ShoppigCart:
+            lock_cart(user.pk)
+        deleted, _ = Model.objects.filter(
+            user=user, recipe_id__in=recipe_ids).delete()
+        return deleted
+
+    def get_short_recipes(self):
+        return Recipe.objects.only(
+            'id', 'name', 'image', 'image_renditions', 'cooking_time')
+
+    @transaction.atomic
     def add_and_destroy(
             self, request, pk=None, Model=None, message=''):
         user = request.user
         if request.method == 'POST':
-            if not Recipe.objects.filter(pk=pk).exists():
+            recipe = self.get_short_recipes().filter(pk=pk).first()
+            if recipe is None:
                 return Response(
                     {'message': 'Нет такого рецепта'},
                     status=status.HTTP_400_BAD_REQUEST
                 )
-            recipe = self.get_object()
-            if Model.objects.filter(user=user, recipe=recipe).exists():
-                return Response(
-                    {'message': f'Рецепт уже есть в {message}'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            Model.objects.create(user=user, recipe=recipe)
+            self.add_recipes(Model, user, [recipe.pk])
             serializer = ShoppingCartFavoriteSerializer(recipe)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
-        recipe = get_object_or_404(Recipe, id=pk)
-        item = Model.objects.filter(user=user, recipe=recipe)
-        if not item.exists():
+        if not self.remove_recipes(Model, user, [pk]):
+            get_object_or_404(Recipe, id=pk)
             return Response(
                 {'message': f'Такого рецепта нет в {message}'},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        item.delete()
         return Response(
             {'message': 'Рецепт успешно удален'},
             status=status.HTTP_204_NO_CONTENT
         )
 
+    @transaction.atomic
+    def bulk_add_and_destroy(self, request, Model=None):
+        serializer = IdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = serializer.validated_data['ids']
+        user = request.user
+        if request.method == 'POST':
+            recipes = self.get_short_recipes().in_bulk(ids)
+            missing = [pk for pk in ids if pk not in recipes]
+            if missing:
+                return Response(
+                    {'message': 'Нет таких рецептов', 'ids': missing},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            self.add_recipes(Model, user, ids)
+            serializer = ShoppingCartFavoriteSerializer(
+                [recipes[pk] for pk in ids], many=True)
+            return Response(serializer.data, status=status.HTTP_201_CREATED)
+        return Response({'deleted': self.remove_recipes(Model, user, ids)})
+
     @action(
         detail=True,
         methods=['post', 'delete'],
@@ -225,6 +497,16 @@ class RecipesViewSet(viewsets.ModelViewSet):
         return self.add_and_destroy(
             request, pk=pk, Model=ShoppigCart, message='списке покупок')
 
+    @action(
+        detail=False,
+        methods=['post', 'delete'],
+        url_path='shopping_cart',
+        url_name='bulk-shopping-cart',
+        permission_classes=[IsAuthenticated]
+    )
+    def bulk_add_and_destroy_to_shopping_cart(self, request):
+        return self.bulk_add_and_destroy(request, Model=ShoppigCart)
+
     @action(
         detail=True,
         methods=['post', 'delete'],
@@ -234,3 +516,24 @@ class RecipesViewSet(viewsets.ModelViewSet):
     def add_and_destroy_to_favorite(self, request, pk=None):
         return self.add_and_destroy(
             request, pk=pk, Model=Favorite, message='избранном')
+
+    @action(
+        detail=False,
+        methods=['post', 'delete'],
+        url_path='favorite',
+        url_name='bulk-favorite',
+        permission_classes=[IsAuthenticated]
+    )
+    def bulk_add_and_destroy_to_favorite(self, request):
+        return self.bulk_add_and_destroy(request, Model=Favorite)
+
+
+class MetricsView(APIView):
+    """Метрики запросов в формате Prometheus, доступны только персоналу."""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return HttpResponse(
+            registry.render(),
+            content_type='text/plain; version=0.0.4; charset=utf-8'
+        )
@@ -0,0 +1,84 @@
+"""Прогрев процессов gunicorn перед обработкой запросов."""
+import threading
+
+from django.conf import settings
+from django.db import connections
+from django.urls import get_resolver
+from django.utils import translation
+from rest_framework.serializers import BaseSerializer
+
+from . import serializers
+from .indexes import ingredient_index, recipe_ingredient_index, tag_cache
+
+WARM_UP_PATHS = (
+    '/api/recipes/',
+    '/api/recipes/1/',
+    '/api/recipes/download_shopping_cart/',
+    '/api/recipes/by_ingredients/',
+    '/api/users/',
+    '/api/users/me/',
+    '/api/users/subscriptions/',
+    '/api/tags/',
+    '/api/ingredients/',
+    '/api/auth/token/login/',
+)
+CONNECT_TIMEOUT = 10
+
+
+def get_serializer_classes():
+    return [
+        value for value in vars(serializers).values()
+        if isinstance(value, type) and issubclass(value, BaseSerializer)
+        and value.__module__ == serializers.__name__
+    ]
+
+
+def warm_up():
+    """Заполняет ленивые кеши, которые иначе строит первый запрос
+    каждого воркера: регулярные выражения URL, переводы, метаданные
+    моделей, поля сериализаторов, справочники и индекс ингредиентов
+    рецептов.
+
+    Вызывается в мастер-процессе до запуска воркеров, которые получают
+    готовые кеши вместе с памятью мастера. Соединения с БД после прогрева
+    закрываются, чтобы воркеры не унаследовали общий сокет.
+    """
+    resolver = get_resolver()
+    for path in WARM_UP_PATHS:
+        resolver.resolve(path)
+    resolver.reverse_dict
+    with translation.override(settings.LANGUAGE_CODE):
+        for serializer_class in get_serializer_classes():
+            serializer_class(context={}).fields
+    try:
+        tag_cache.all()
+        ingredient_index.all()
+        recipe_ingredient_index.load()
+    finally:
+        connections.close_all()
+
+
+def connect():
+    for connection in connections.all():
+        connection.ensure_connection()
+
+
+def open_connections(executor=None, threads=1):
+    """Заранее открывает постоянные соединения с БД воркера.
+
+    Соединения привязаны к потоку, поэтому для воркера gthread они
+    открываются в каждом потоке его пула executor.
+    """
+    if executor is None:
+        return connect()
+    barrier = threading.Barrier(threads)
+
+    def connect_in_thread():
+        # Пока все задачи ждут друг друга, пул запускает для каждой
+        # отдельный поток.
+        barrier.wait(CONNECT_TIMEOUT)
+        connect()
+
+    for future in [executor.submit(connect_in_thread)
+                   for _ in range(threads)]:
+        future.result()
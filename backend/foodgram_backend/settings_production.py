@@ -0,0 +1,23 @@
+"""Настройки для продакшена, подключаются в gunicorn.conf.py.
+
+API принимает только токены и сессии: базовая аутентификация
+вычисляет хеш пароля (PBKDF2) на каждом запросе. Токены кешируются
+только в общем для воркеров кеше: из кеша в памяти процесса удаленный
+токен продолжал бы действовать в других воркерах.
+"""
+from .settings import *  # noqa: F401, F403
+from .settings import AUTH_TOKEN_CACHE, CACHES, REST_FRAMEWORK
+
+PROCESS_LOCAL_CACHES = ('django.core.cache.backends.locmem.LocMemCache',)
+
+if (AUTH_TOKEN_CACHE is not None
+        and CACHES[AUTH_TOKEN_CACHE]['BACKEND'] in PROCESS_LOCAL_CACHES):
+    AUTH_TOKEN_CACHE = None
+
+REST_FRAMEWORK = {
+    **REST_FRAMEWORK,
+    'DEFAULT_AUTHENTICATION_CLASSES': [
+        'api.authentication.CachedTokenAuthentication',
+        'rest_framework.authentication.SessionAuthentication',
+    ],
+}
@@ -0,0 +1,69 @@
+"""Настройки gunicorn для продакшена.
+
+Приложение загружается и прогревается в мастер-процессе до запуска
+воркеров (preload_app), воркеры получают готовые кеши вместе с его
+памятью. Воркеры перезапускаются после max_requests запросов, чтобы
+ограничить рост памяти, а снимки метрик завершившихся воркеров мастер
+переносит в общий файл. При ASYNC_API=true запускается ASGI-приложение
+с воркерами uvicorn. Используется профиль настроек settings_production.
+"""
+import os
+
+ASYNC_API = os.getenv('ASYNC_API', 'false').lower() == 'true'
+CORES = (
+    len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity')
+    else os.cpu_count()
+)
+
+os.environ.setdefault(
+    'DJANGO_SETTINGS_MODULE', 'foodgram_backend.settings_production')
+
+if ASYNC_API:
+    # Под ASGI запросы к БД каждого HTTP-запроса идут в новом потоке,
+    # и постоянные соединения не переиспользуются.
+    os.environ.setdefault('CONN_MAX_AGE', '0')
+    wsgi_app = 'foodgram_backend.asgi:application'
+    worker_class = 'uvicorn.workers.UvicornWorker'
+else:
+    wsgi_app = 'foodgram_backend.wsgi:application'
+    worker_class = 'gthread'
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:9000')
+# Процессы загружают ядра, потоки ждут БД, пока другие потоки работают.
+workers = int(os.getenv('GUNICORN_WORKERS', CORES + 1))
+threads = int(os.getenv('GUNICORN_THREADS', 4))
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 2000))
+max_requests_jitter = max_requests // 10
+preload_app = True
+timeout = 30
+graceful_timeout = 30
+keepalive = 5
+if os.path.isdir('/dev/shm'):
+    worker_tmp_dir = '/dev/shm'
+
+accesslog = '-'
+errorlog = '-'
+loglevel = os.getenv('GUNICORN_LOG_LEVEL', 'info')
+
+
+def when_ready(server):
+    from api.metrics import registry
+    from api.warmup import warm_up
+
+    # Воркеры прошлого запуска завершены, их PID могут достаться новым.
+    registry.mark_processes_dead()
+    warm_up()
+
+
+def post_worker_init(worker):
+    if ASYNC_API:
+        return
+    from api.warmup import open_connections
+
+    open_connections(getattr(worker, 'tpool', None), worker.cfg.threads)
+
+
+def child_exit(server, worker):
+    from api.metrics import registry
+
+    registry.mark_processes_dead([worker.pid])